@@ -10,7 +10,7 @@ TestBoardsIdentifiers = [
     "Card005",
 ]
 
-def GenerateTestImage():
+def GenerateTestImage(Generator=random):
     from PIL import Image, ImageDraw
     import io
 
@@ -18,9 +18,9 @@ def GenerateTestImage():
     Draw = ImageDraw.Draw(Image)
     
     Draw.rectangle([20, 20, 80, 80], 
-                   fill=(random.randint(0, 255), 
-                         random.randint(0, 255), 
-                         random.randint(0, 255)))
+                   fill=(Generator.randint(0, 255), 
+                         Generator.randint(0, 255), 
+                         Generator.randint(0, 255)))
     
     Buffer = io.BytesIO()
     Image.save(Buffer, format='PNG')
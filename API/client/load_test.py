@@ -0,0 +1,233 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+
+from FakeEsp_send_test import GenerateTestImage, TestBoardsIdentifiers
+from client_get_test import PlantTrackingTestClient
+
+# (client method, endpoint, weight, argument drawn for each call) replayed by the dashboards
+DASHBOARD_MIX = [
+    ("test_get_plant_list", "GET /GetPlantList", 10, None),
+    ("test_get_plant_infos", "GET /GetPlantInfos", 15, "plant"),
+    ("test_get_plant_besoins", "GET /GetPlantBesoins", 10, "plant"),
+    ("test_get_plant_interventions", "GET /GetPlantInterventions", 8, "plant"),
+    ("test_get_intervention_infos", "GET /GetInterventionInfos", 4, "intervention"),
+    ("test_get_latest_intervention", "GET /GetLatestIntervention", 8, "plant"),
+    ("test_get_all_rapports", "GET /GetAllRapports", 8, "plant"),
+    ("test_get_rapport", "GET /GetRapport", 4, "rapport"),
+    ("test_get_latest_rapport", "GET /GetLatestRapport", 15, "plant"),
+    ("test_get_liste_membre", "GET /GetListeMembre", 5, None),
+    ("test_get_membre_infos", "GET /GetMembreInfos", 5, "membre"),
+    ("test_get_hierarchie", "GET /GetHierarchie", 4, None),
+    ("test_get_agenda_classe", "GET /GetAgendaClasse", 4, "classe"),
+]
+
+UPLOAD_ENDPOINT = "POST /sensor-data"
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def report(self, duration):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4),
+                "throughput_rps": round(len(samples) / duration, 2),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+            }
+        total = sum(stats["requests"] for stats in endpoints.values())
+        errors = sum(stats["errors"] for stats in endpoints.values())
+        return {
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "throughput_rps": round(total / duration, 2),
+            "endpoints": endpoints,
+        }
+
+
+def percentile(latencies, rank):
+    # Nearest-rank percentile, in milliseconds
+    if not latencies:
+        return None
+    index = max(0, -(-len(latencies) * rank // 100) - 1)
+    return round(latencies[index] * 1000, 2)
+
+
+class LoadTestClient(PlantTrackingTestClient):
+    # Keeps the status of the last response instead of printing it
+    def _print_response(self, response, endpoint_name):
+        self.last_status = response.status_code
+
+
+def sensor_payload(rng, board_identifier, with_image):
+    # Same shape as TestSensorData
+    payload = {
+        "id": board_identifier,
+        "temperature": round(rng.uniform(20.0, 30.0), 1),
+        "light": rng.randint(100, 1000),
+        "ground_humidity": [
+            round(rng.uniform(10.0, 80.0), 1),
+            round(rng.uniform(10.0, 80.0), 1),
+            round(rng.uniform(10.0, 80.0), 1)
+        ],
+    }
+    if with_image:
+        payload["image"] = GenerateTestImage(rng)
+    return payload
+
+
+def run_board(index, options, recorder, deadline):
+    rng = random.Random(f"{options.seed}-board-{index}")
+    board_identifier = options.cards[index % len(options.cards)]
+    session = requests.Session()
+    # Boards wake up at a random phase of the interval, then keep to their schedule
+    next_upload = time.monotonic() + rng.uniform(0, options.interval)
+    upload = 0
+    while True:
+        pause = next_upload - time.monotonic()
+        if next_upload >= deadline:
+            break
+        if pause > 0:
+            time.sleep(pause)
+        payload = sensor_payload(rng, board_identifier, options.image_every and upload % options.image_every == 0)
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{options.url}/sensor-data", json=payload, timeout=options.timeout)
+            ok = response.status_code < 400
+        except requests.exceptions.RequestException:
+            ok = False
+        recorder.record(UPLOAD_ENDPOINT, time.perf_counter() - started, ok)
+        upload += 1
+        next_upload += options.interval
+
+
+def dashboard_argument(rng, kind, options):
+    if kind == "plant":
+        return rng.choice(options.plant_ids)
+    if kind == "intervention":
+        return rng.choice(options.intervention_ids)
+    if kind == "rapport":
+        return rng.choice(options.rapport_ids)
+    if kind == "membre":
+        return rng.choice(options.membre_ids)
+    if kind == "classe":
+        return rng.choice(options.classes)
+    return None
+
+
+def run_dashboard(index, options, recorder, deadline):
+    rng = random.Random(f"{options.seed}-dashboard-{index}")
+    client = LoadTestClient(options.url)
+    weights = [weight for _, _, weight, _ in DASHBOARD_MIX]
+    while time.monotonic() < deadline:
+        method, endpoint, _, kind = rng.choices(DASHBOARD_MIX, weights)[0]
+        argument = dashboard_argument(rng, kind, options)
+        call = getattr(client, method)
+        client.last_status = None
+        started = time.perf_counter()
+        try:
+            if argument is None:
+                call()
+            else:
+                call(argument)
+            ok = client.last_status is not None and client.last_status < 400
+        except requests.exceptions.RequestException:
+            ok = False
+        recorder.record(endpoint, time.perf_counter() - started, ok)
+        time.sleep(rng.expovariate(1 / options.think_time) if options.think_time else 0)
+
+
+def run(options):
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + options.duration
+    threads = [
+        threading.Thread(target=run_board, args=(index, options, recorder, deadline), daemon=True)
+        for index in range(options.boards)
+    ] + [
+        threading.Thread(target=run_dashboard, args=(index, options, recorder, deadline), daemon=True)
+        for index in range(options.dashboards)
+    ]
+    # The client classes print every call, which would dominate the measurement
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return recorder.report(time.monotonic() - started)
+
+
+def id_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def name_list(value):
+    return [item for item in value.split(",") if item]
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Load test the plant tracking server with virtual boards and dashboards")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--boards", type=int, default=10, help="virtual ESP boards uploading readings")
+    parser.add_argument("--dashboards", type=int, default=5, help="dashboard clients replaying the GET mix")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between two uploads of a board")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between dashboard calls, in seconds")
+    parser.add_argument("--image-every", type=int, default=1, help="attach an image to every Nth upload, 0 for none")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cards", type=name_list, default=TestBoardsIdentifiers)
+    # Defaults match the seed data of a fresh database
+    parser.add_argument("--plant-ids", type=id_list, default=list(range(11, 22)))
+    parser.add_argument("--intervention-ids", type=id_list, default=list(range(1, 21)))
+    parser.add_argument("--membre-ids", type=id_list, default=list(range(1, 21)))
+    parser.add_argument("--rapport-ids", type=name_list, default=["2024-04", "2024-05", "2024-06", "2024-07", "2024-08"])
+    parser.add_argument("--classes", type=name_list, default=["2B"])
+    parser.add_argument("--output", default="load_test_report.json")
+    return parser.parse_args()
+
+
+def main():
+    options = parse_options()
+    results = run(options)
+    report = {
+        "config": {
+            key: value for key, value in vars(options).items() if key != "output"
+        },
+        "results": results,
+    }
+    with open(options.output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print(f"{'endpoint':<32} {'requests':>8} {'errors':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, stats in results["endpoints"].items():
+        print(
+            f"{endpoint:<32} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_rps']:>8} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+    print(f"\n{results['requests']} requests, {results['throughput_rps']} req/s, error rate {results['error_rate']:.2%}")
+    print(f"Report written to {options.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import server
+from generate_dataset import generate
+from query_plan_check import SAMPLE_QUERIES
+
+BASELINES_PATH = os.path.join(server.script_dir, "benchmark_baselines.json")
+
+# (members, cards, plants, days of hourly readings) generated on top of the initial test data
+SCALES = {
+    'small': (100, 10, 100, 30),
+    'medium': (500, 50, 500, 90),
+    'full': (1000, 100, 1000, 365),
+}
+
+DATASET_SEED = 1
+ADMIN_API_KEY = 'APIKEY12'
+REGRESSION_THRESHOLD = 0.25
+# Plain sqlite3 work timed between the iterations of every benchmark. Results are compared as
+# a ratio to it, so a baseline holds on another machine or while the machine is loaded
+REFERENCE_QUERY = """
+    SELECT Date_Mesure, Humidite, Temperature, Luminosite FROM mesure
+    WHERE Id_Plante = 12 ORDER BY Date_Mesure LIMIT 100
+"""
+
+
+class FakeSocket:
+    # Enough of a socket for StreamRequestHandler: the request comes from memory
+    # and the response is collected instead of sent
+    def __init__(self, request):
+        self.request = request
+        self.response = bytearray()
+
+    def makefile(self, mode, buffering=None):
+        return io.BytesIO(self.request)
+
+    def sendall(self, data):
+        self.response += data
+
+    def settimeout(self, timeout):
+        pass
+
+
+class FakeServer:
+    # No supports_keep_alive: the handler answers one request and closes
+    pass
+
+
+def request_bytes(method, path, body=b"", headers=()):
+    lines = [f"{method} {path} HTTP/1.1", "Host: benchmark", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('ascii') + body
+
+
+def handle(raw_request):
+    connection = FakeSocket(raw_request)
+    server.PlantTrackingHandler(connection, ('127.0.0.1', 0), FakeServer())
+    return int(connection.response[9:12])
+
+
+def record_profile(admin):
+    # /GetProfile needs a stored report, an unknown id would only measure its 404
+    connection = FakeSocket(request_bytes('GET', f"/GetPlantInfos?{SAMPLE_QUERIES['/GetPlantInfos']}&profile=1", headers=admin))
+    server.PlantTrackingHandler(connection, ('127.0.0.1', 0), FakeServer())
+    head = bytes(connection.response).partition(b"\r\n\r\n")[0].decode('latin-1')
+    headers = dict(line.split(": ", 1) for line in head.split("\r\n")[1:])
+    return headers['X-Profile-Id']
+
+
+def machine_description():
+    return f"{platform.machine()} {platform.system()}, Python {platform.python_version()}, SQLite {sqlite3.sqlite_version}"
+
+
+class Timings(list):
+    # Durations of one benchmark, reference holds those of the reference work run alongside
+    def __init__(self):
+        super().__init__()
+        self.reference = []
+
+
+reference_work = None
+
+
+def measure(action, iterations, warmup=3):
+    for _ in range(warmup):
+        action()
+    timings = Timings()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+        if reference_work:
+            started = time.perf_counter()
+            reference_work()
+            timings.reference.append(time.perf_counter() - started)
+    return timings
+
+
+def benchmark_initialize_database(temp_dir, iterations):
+    seeded_path = server.db_path
+    paths = iter(os.path.join(temp_dir, f"fresh-{index}.db") for index in range(iterations + 3))
+
+    def fresh():
+        server.db_path = next(paths)
+        server.initialize_database()
+
+    try:
+        results = {"initialize_database (fresh)": measure(fresh, iterations)}
+    finally:
+        server.db_path = seeded_path
+    results["initialize_database (up to date)"] = measure(server.initialize_database, iterations)
+    return results
+
+
+def benchmark_requests(iterations, cards):
+    results = {}
+    statuses = {}
+    admin = (('X-API-Key', ADMIN_API_KEY),)
+    queries = dict(SAMPLE_QUERIES, **{'/GetProfile': f"id={record_profile(admin)}"})
+
+    for (method, path), route in server.ROUTES.items():
+        if method != 'GET':
+            continue
+        raw_request = request_bytes('GET', f"{path}?{queries[path]}", headers=admin if route.admin else ())
+
+        def get(name=f"GET {path}", raw_request=raw_request):
+            # Every iteration misses the response cache, the handler does the full work
+            server.response_cache.clear()
+            statuses[name] = handle(raw_request)
+
+        results[f"GET {path}"] = measure(get, iterations)
+
+    rng = random.Random(0)
+    readings = iter(range(sys.maxsize))
+
+    def post(with_image):
+        reading = {
+            "id": f"Gen{next(readings) % cards:05d}",
+            "temperature": round(rng.uniform(20.0, 30.0), 1),
+            "light": rng.randint(100, 1000),
+            "ground_humidity": [round(rng.uniform(10.0, 80.0), 1) for _ in range(3)],
+        }
+        if with_image:
+            # A new image every time, a repeated one would only hit the blob deduplication
+            reading["image"] = base64.b64encode(b'\x89PNG\r\n\x1a\n' + rng.randbytes(20 * 1024)).decode('ascii')
+        name = "POST /sensor-data (image)" if with_image else "POST /sensor-data"
+        statuses[name] = handle(request_bytes('POST', '/sensor-data', json.dumps(reading).encode('utf-8')))
+
+    results["POST /sensor-data"] = measure(lambda: post(False), iterations)
+    results["POST /sensor-data (image)"] = measure(lambda: post(True), iterations)
+    return results, statuses
+
+
+def benchmark_json(iterations):
+    with sqlite3.connect(server.db_path) as conn:
+        rows = conn.execute("""
+            SELECT Date_Mesure, Humidite, Temperature, Luminosite FROM mesure
+            WHERE Id_Plante = 12 ORDER BY Date_Mesure LIMIT 1000
+        """).fetchall()
+    data = server.rows_to_dicts(("date", "humidite", "temperature", "luminosite"), rows)
+    return {f"encode_json 1000 readings ({server.JSON_BACKEND})": measure(lambda: server.encode_json(data), iterations)}
+
+
+def summarize(timings):
+    summary = {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+    }
+    if timings.reference:
+        summary["relative"] = round(statistics.median(timings) / statistics.median(timings.reference), 3)
+    return summary
+
+
+def compare(results, baseline, threshold, relative=True):
+    # relative compares the ratios to the reference work, otherwise the absolute medians
+    regressions = []
+    print(f"{'benchmark':<46} {'median':>9} {'p95':>9} {'baseline':>9} {'change':>8}")
+    for name, stats in results.items():
+        recorded = baseline.get(name, {})
+        expected = recorded.get("median_ms")
+        if relative:
+            # The baseline median at the speed the reference ran in this run
+            expected = recorded.get("relative") and round(recorded["relative"] * stats["median_ms"] / stats["relative"], 3)
+        change = ""
+        if expected:
+            ratio = stats["median_ms"] / expected - 1
+            change = f"{ratio:+.0%}"
+            if ratio > threshold:
+                regressions.append(name)
+                change += " !"
+        print(f"{name:<46} {stats['median_ms']:>9} {stats['p95_ms']:>9} {expected or '-':>9} {change:>8}")
+    return regressions
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Benchmark the request handler in-process against a seeded database")
+    parser.add_argument("--scale", choices=SCALES, default='small')
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="relative slowdown of the median reported as a regression")
+    parser.add_argument("--update-baseline", action='store_true', help="record this run as the baseline of the scale")
+    return parser.parse_args()
+
+
+def main():
+    options = parse_options()
+    members, cards, plants, days = SCALES[options.scale]
+    # Requests still log through the queue and the log file, only the console echo is dropped
+    if server.log_listener:
+        server.log_listener.handlers = tuple(
+            handler for handler in server.log_listener.handlers if type(handler) is not logging.StreamHandler
+        )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server.db_path = os.path.join(temp_dir, "plant_tracking.db")
+        server.photos_dir = os.path.join(temp_dir, "plant_photos")
+        server.profiles_dir = os.path.join(temp_dir, "profiles")
+        os.makedirs(server.photos_dir)
+        server.initialize_database()
+
+        started = time.perf_counter()
+        conn = sqlite3.connect(server.db_path, isolation_level=None)
+        counts = generate(conn, DATASET_SEED, members, plants, cards, days)
+        conn.close()
+        print(f"Seeded {options.scale}: {', '.join(f'{count} {name}' for name, count in counts.items())} in {time.perf_counter() - started:.1f}s\n")
+
+        server.db_pool = server.ConnectionPool(server.db_path)
+        server.card_index.invalidate()
+        reference_conn = sqlite3.connect(server.db_path)
+        global reference_work
+        reference_work = lambda: json.dumps(reference_conn.execute(REFERENCE_QUERY).fetchall())
+        try:
+            timings, statuses = benchmark_requests(options.iterations, cards)
+            timings.update(benchmark_json(options.iterations))
+            timings.update(benchmark_initialize_database(temp_dir, options.iterations))
+        finally:
+            reference_work = None
+            reference_conn.close()
+            server.db_pool.close()
+
+    failed = {name: status for name, status in statuses.items() if status >= 500}
+    results = {name: summarize(values) for name, values in timings.items()}
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as baselines_file:
+            baselines = json.load(baselines_file)
+    baseline = baselines.get(options.scale, {})
+    relative = all("relative" in stats for stats in baseline.get("results", {}).values())
+    if baseline and not relative and baseline.get("machine") != machine_description():
+        # Absolute timings from another machine say nothing about this change
+        print(f"Baseline for {options.scale} was recorded on {baseline.get('machine')}, not comparing on {machine_description()}\n")
+        baseline = {}
+    regressions = compare(results, baseline.get("results", {}), options.threshold, relative)
+
+    for name, status in failed.items():
+        print(f"\n{name} answered {status}")
+
+    if options.update_baseline:
+        baselines[options.scale] = {
+            "recorded": time.strftime('%Y-%m-%d'),
+            "machine": machine_description(),
+            "iterations": options.iterations,
+            "results": results,
+        }
+        with open(BASELINES_PATH, "w") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2)
+            baselines_file.write("\n")
+        print(f"\nBaseline for {options.scale} written to {BASELINES_PATH}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) above {options.threshold:.0%}: {', '.join(regressions)}")
+
+    return 1 if failed or (regressions and not options.update_baseline) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import os
+import json
+import sqlite3
+import tempfile
+import timeit
+
+import server
+
+MEMBER_COUNT = 1000
+READING_COUNT = 5000
+ITERATIONS = 200
+
+# (path, query string, SELECT of the former dict-based handler)
+ENDPOINTS = [
+    ('/GetListeMembre', "limit=1000", (
+        ("id", "nom", "prenom", "classe", "role"),
+        "SELECT Id, Nom, Prenom, Classe, Role_Association FROM membre ORDER BY Classe, Nom, Id LIMIT 1000"
+    )),
+    ('/GetHistorique', "id_plante=12&limit=1000", (
+        ("date", "humidite", "temperature", "luminosite"),
+        "SELECT Date_Mesure, Humidite, Temperature, Luminosite FROM mesure WHERE Id_Plante = 12 ORDER BY Date_Mesure, Id LIMIT 1000"
+    )),
+]
+
+
+def seed(conn):
+    conn.executemany("""
+        INSERT INTO membre (Cle_API, Nom, Prenom, Classe, Role_Association, Date_inscription)
+        VALUES (?, ?, ?, '2B', 'Membre', '2024-09-01')
+    """, [(f"bench-{index}", f"Nom{index:04d}", f"Prénom{index}") for index in range(MEMBER_COUNT)])
+    conn.executemany("""
+        INSERT INTO mesure (Id_Plante, Date_Mesure, Humidite, Temperature, Luminosite)
+        VALUES (12, datetime('2025-01-01', ? || ' minutes'), ?, ?, ?)
+    """, [(f"+{index}", 40 + index % 7, 20.5 + index % 3, 300 + index % 50) for index in range(READING_COUNT)])
+    conn.commit()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server.db_path = os.path.join(temp_dir, "plant_tracking.db")
+        server.initialize_database()
+        conn = sqlite3.connect(server.db_path)
+        seed(conn)
+        cursor = conn.cursor()
+
+        for path, query, (keys, select) in ENDPOINTS:
+            route = server.ROUTES[('GET', path)]
+            params = route.parse_params(query)
+            variants = [
+                ("dicts + json", lambda: json.dumps(server.rows_to_dicts(keys, cursor.execute(select).fetchall())).encode('utf-8')),
+                ("json_object rows", lambda: server.encode_json(route.handler(None, cursor, params))),
+            ]
+            if server.orjson:
+                variants.insert(1, ("dicts + orjson", lambda: server.orjson.dumps(server.rows_to_dicts(keys, cursor.execute(select).fetchall()))))
+
+            print(f"{path}?{query}")
+            for name, encode in variants:
+                size = len(encode())
+                elapsed = timeit.timeit(encode, number=ITERATIONS)
+                print(f"  {name:<18} {elapsed / ITERATIONS * 1000:.2f} ms per response ({size} bytes)")
+
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
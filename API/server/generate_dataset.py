@@ -0,0 +1,299 @@
+import argparse
+import datetime
+import hashlib
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import server
+
+# Size of the initial test data, --scale multiplies it
+BASE_MEMBERS = 20
+BASE_PLANTS = 20
+BASE_CARDS = 10
+
+DEFAULT_START = '2024-01-01'
+DEFAULT_DAYS = 365
+INTERVENTIONS_PER_YEAR = 12
+PHOTO_EVERY_HOURS = 24
+# Share of hourly readings lost to dead batteries and Wi-Fi drops
+MISSED_READINGS = 0.01
+INSERT_BATCH_ROWS = 50000
+
+FIRST_NAMES = ['Olivia', 'Noah', 'Emma', 'Liam', 'Ava', 'Sophia', 'Mason', 'Isabella', 'James', 'Charlotte',
+               'Daniel', 'Aria', 'Ethan', 'Mia', 'Lucas', 'Sophie', 'Oliver', 'Aiden', 'Chloé', 'Hugo', 'Léa', 'Jules']
+LAST_NAMES = ['Wilson', 'Taylor', 'Anderson', 'Thomas', 'Jackson', 'White', 'Harris', 'Martin', 'Thompson', 'Garcia',
+              'Rodriguez', 'Lee', 'Chen', 'Kumar', 'Schmidt', 'Wang', 'Nguyen', 'Patel', 'Kim', 'Tanaka', 'Dubois', 'Moreau']
+ROLES = [('Membre', 60), ('Volunteer', 30), ('Responsable Technique', 3), ('Responsable Communication', 3),
+         ('Vice President', 2), ('President', 2)]
+SPECIES = [('Monstera', 'Indoor'), ('Sunflower', 'Outdoor'), ('Mint', 'Herb'), ('Bonsai', 'Indoor'),
+           ('Venus Flytrap', 'Carnivorous'), ('Rosemary', 'Herb'), ('Jade Plant', 'Succulent'), ('Tulip', 'Flower'),
+           ('Ficus', 'Indoor'), ('Mimosa', 'Sensitive'), ('Hibiscus', 'Flower'), ('Strawberry', 'Fruit')]
+STATUSES = ['normal', 'Flowering', 'Watered', 'Growing', 'Dry', 'Fruiting']
+LOCATIONS = ['Serre', 'Jardin', 'Cuisine', 'Atelier', 'Laboratoire', 'Terrasse', 'Bureau', 'Couloir']
+NOTES = ['Arrosage et vérification de la santé générale', 'Taille et nutrition', 'Fertilisation et rotation',
+         'Ajustement de exposition lumineuse', 'Rempotage', 'Traitement contre les parasites']
+
+
+def insert_batches(conn, sql, rows):
+    # executemany over bounded slices keeps memory flat for years of readings
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_ROWS:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch.clear()
+    conn.executemany(sql, batch)
+    return count + len(batch)
+
+
+def generate_members(conn, rng, count):
+    classes = [row[0] for row in conn.execute("SELECT Nom_classe FROM classe ORDER BY Nom_classe")]
+    roles, weights = zip(*ROLES)
+    first_member = conn.execute("SELECT COALESCE(MAX(Id), 0) + 1 FROM membre").fetchone()[0]
+    conn.executemany("""
+        INSERT INTO membre (Cle_API, Nom, Prenom, Classe, Role_Association, Date_inscription)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (
+            f"GEN{index:07d}{rng.getrandbits(32):08x}", rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES),
+            rng.choice(classes), rng.choices(roles, weights)[0],
+            (datetime.date(2020, 9, 1) + datetime.timedelta(days=rng.randrange(4 * 365))).isoformat()
+        )
+        for index in range(count)
+    ])
+    return list(range(first_member, first_member + count))
+
+
+def generate_plants(conn, rng, count, member_ids):
+    first_plant = conn.execute("SELECT COALESCE(MAX(Id), 0) + 1 FROM plante").fetchone()[0]
+    rows = []
+    for index in range(count):
+        name, kind = rng.choice(SPECIES)
+        rows.append((f"{name} {index}", kind, rng.choice(STATUSES), rng.choice(LOCATIONS), rng.choice(member_ids)))
+    conn.executemany("""
+        INSERT INTO plante (Nom, Type_Plante, Statut, Localisation, Superviseur)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    plant_ids = list(range(first_plant, first_plant + count))
+    # Members look after a plant of their own
+    conn.executemany("UPDATE membre SET Plante_Principale = ? WHERE Id = ?", [
+        (rng.choice(plant_ids), member_id) for member_id in member_ids
+    ])
+    return plant_ids
+
+
+def generate_cards(conn, count, plant_ids):
+    # Plants are spread round-robin, every generated plant is watched by one card
+    cards = {f"Gen{card:05d}": plant_ids[card::count] for card in range(count)}
+    # The Cartes triggers fill carte_plante from the Plantes lists
+    conn.executemany("INSERT INTO Cartes (Identifier, Plantes) VALUES (?, ?)", [
+        (card_id, ','.join(map(str, plants))) for card_id, plants in cards.items()
+    ])
+
+
+def generate_interventions(conn, rng, plant_ids, member_ids, start, days, per_year):
+    rate = per_year * days / 365
+    rows = []
+    for plant_id in plant_ids:
+        for _ in range(poisson(rng, rate)):
+            day = start + datetime.timedelta(days=rng.randrange(days))
+            rows.append((day.isoformat(), rng.choice(member_ids), plant_id, rng.choice(NOTES)))
+    rows.sort()
+    conn.executemany("""
+        INSERT INTO intervention (Date_intervention, Id_intervenant, Id_Plante, Note)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+def poisson(rng, rate):
+    # Knuth's method, interventions per plant are few so the loop stays short
+    threshold = math.exp(-rate)
+    count, product = 0, rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def card_readings(rng, card_id, start, days, photo_every_hours, photos):
+    # One reading per hour, as sent by the ESP between two deep sleeps: a daily light and
+    # temperature cycle on top of the season, and soil that dries until it is watered
+    humidity = rng.uniform(40, 80)
+    offset = rng.uniform(-2, 2)
+    for hour in range(days * 24):
+        humidity -= rng.uniform(0.05, 0.4)
+        if humidity < 15 or rng.random() < 0.005:
+            humidity = rng.uniform(60, 85)
+        if rng.random() < MISSED_READINGS:
+            continue
+
+        measured_at = start + datetime.timedelta(hours=hour)
+        daylight = max(0.0, math.sin((measured_at.hour - 6) / 12 * math.pi))
+        season = math.cos((measured_at.timetuple().tm_yday - 200) / 365 * 2 * math.pi)
+        temperature = round(20 + 4 * season + 3 * daylight + offset + rng.gauss(0, 0.5), 1)
+        light = round(50 + 900 * daylight * (0.7 + 0.3 * season) + rng.uniform(0, 40))
+
+        photo = None
+        measured_at_text = measured_at.strftime('%Y-%m-%d %H:%M:%S')
+        if photo_every_hours and hour % photo_every_hours == 12:
+            digest = hashlib.sha256(f"{card_id}-{hour}".encode('ascii')).hexdigest()
+            photo = server.photo_blob_path(digest, 'jpg')
+            photos.append((digest, photo, rng.randint(30000, 120000), measured_at_text))
+        yield measured_at_text, round(humidity, 1), temperature, light, photo
+
+
+def generate_readings(conn, seed, start, days, photo_every_hours):
+    links = {}
+    for card_id, plant_id in conn.execute("SELECT Identifier, Id_Plante FROM carte_plante ORDER BY Identifier, Id_Plante"):
+        links.setdefault(card_id, []).append(plant_id)
+
+    start = datetime.datetime.combine(start, datetime.time())
+    readings = 0
+    photo_count = 0
+    for card_id, plant_ids in links.items():
+        photos = []
+        # A card reading is stored for every plant it watches, as ingest_readings does
+        card_rows = list(card_readings(random.Random(f"{seed}-{card_id}"), card_id, start, days, photo_every_hours, photos))
+        readings += insert_batches(conn, """
+            INSERT INTO mesure (Id_Plante, Date_Mesure, Humidite, Temperature, Luminosite, Photo)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((plant_id, *row) for plant_id in plant_ids for row in card_rows))
+        conn.executemany("INSERT OR IGNORE INTO photo (Empreinte, Chemin, Taille, Date_Ajout) VALUES (?, ?, ?, ?)", photos)
+        conn.executemany("INSERT OR IGNORE INTO plante_photo (Id_Plante, Empreinte, Date_Photo) VALUES (?, ?, ?)", [
+            (plant_id, digest, measured_at)
+            for plant_id in plant_ids for digest, _, _, measured_at in photos
+        ])
+        photo_count += len(photos)
+    return readings, photo_count
+
+
+def finish_plants(conn):
+    # Current values and the latest photo follow the stored history, as after live ingestion
+    conn.execute("""
+        UPDATE plante
+        SET (Humidite, Temperature, Luminosite) = (
+            SELECT Humidite, Temperature, Luminosite FROM mesure
+            WHERE Id_Plante = plante.Id ORDER BY Date_Mesure DESC LIMIT 1
+        )
+        WHERE EXISTS (SELECT 1 FROM mesure WHERE Id_Plante = plante.Id)
+    """)
+    conn.execute("""
+        UPDATE plante
+        SET Derniere_Photo = (
+            SELECT Photo FROM mesure
+            WHERE Id_Plante = plante.Id AND Photo IS NOT NULL ORDER BY Date_Mesure DESC LIMIT 1
+        )
+        WHERE EXISTS (SELECT 1 FROM mesure WHERE Id_Plante = plante.Id AND Photo IS NOT NULL)
+    """)
+
+
+def generate(conn, seed, members, plants, cards, days=DEFAULT_DAYS, start=DEFAULT_START,
+             interventions_per_year=INTERVENTIONS_PER_YEAR, photo_every_hours=PHOTO_EVERY_HOURS):
+    # conn must be opened with isolation_level=None; the rows are written in one transaction,
+    # then the rollups are built by the batched agregat backfill
+    rng = random.Random(seed)
+    start = datetime.date.fromisoformat(start)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(f"PRAGMA cache_size = -{256 * 1024}")
+    conn.execute("BEGIN")
+    member_ids = generate_members(conn, rng, members)
+    plant_ids = generate_plants(conn, rng, plants, member_ids)
+    generate_cards(conn, cards, plant_ids)
+    interventions = generate_interventions(conn, rng, plant_ids, member_ids, start, days, interventions_per_year)
+    readings, photos = generate_readings(conn, seed, start, days, photo_every_hours)
+    finish_plants(conn)
+    conn.execute("COMMIT")
+    server.migration_agregat(conn)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("ANALYZE")
+    return {"members": members, "plants": plants, "cards": cards, "interventions": interventions, "readings": readings, "photos": photos}
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected at least 1, got {value}")
+    return number
+
+
+def non_negative(kind):
+    def convert(value):
+        number = kind(value)
+        if number < 0:
+            raise argparse.ArgumentTypeError(f"expected 0 or more, got {value}")
+        return number
+    return convert
+
+
+def date_text(value):
+    datetime.date.fromisoformat(value)
+    return value
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Generate a synthetic plant_tracking database, deterministic for a given seed")
+    parser.add_argument("output", help="database file to create")
+    parser.add_argument("--scale", type=non_negative(float), default=1, help="multiple of the initial test data size")
+    parser.add_argument("--members", type=positive_int)
+    parser.add_argument("--plants", type=positive_int)
+    parser.add_argument("--cards", type=positive_int, help="at most one per plant")
+    parser.add_argument("--start", type=date_text, default=DEFAULT_START, help="date of the first reading")
+    parser.add_argument("--days", type=positive_int, default=DEFAULT_DAYS, help="days of hourly readings")
+    parser.add_argument("--interventions-per-year", type=non_negative(float), default=INTERVENTIONS_PER_YEAR)
+    parser.add_argument("--photo-every-hours", type=non_negative(int), default=PHOTO_EVERY_HOURS, help="0 for no photos")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--force", action='store_true', help="replace an existing output file")
+    options = parser.parse_args()
+
+    # Sizes left out follow --scale, every plant needs a supervisor and every card a plant
+    if options.members is None:
+        options.members = max(1, round(BASE_MEMBERS * options.scale))
+    if options.plants is None:
+        options.plants = max(1, round(BASE_PLANTS * options.scale))
+    if options.cards is None:
+        options.cards = min(max(1, round(BASE_CARDS * options.scale)), options.plants)
+    if options.cards > options.plants:
+        parser.error(f"--cards ({options.cards}) cannot exceed the number of plants ({options.plants})")
+    return options
+
+
+def main():
+    options = parse_options()
+    if os.path.exists(options.output):
+        if not options.force:
+            print(f"{options.output} already exists, use --force to replace it")
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(options.output + suffix):
+                os.remove(options.output + suffix)
+
+    started = time.perf_counter()
+    server.db_path = os.path.abspath(options.output)
+    server.initialize_database()
+    conn = sqlite3.connect(server.db_path, isolation_level=None)
+    counts = generate(
+        conn, options.seed,
+        members=options.members,
+        plants=options.plants,
+        cards=options.cards,
+        days=options.days,
+        start=options.start,
+        interventions_per_year=options.interventions_per_year,
+        photo_every_hours=options.photo_every_hours
+    )
+    conn.close()
+
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    print(f"Generated {options.output} ({os.path.getsize(options.output) / 1024 / 1024:.1f} MB) in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
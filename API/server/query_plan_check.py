@@ -0,0 +1,152 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import urllib.parse
+
+import server
+
+# Query string used to exercise each GET endpoint against the seed data
+SAMPLE_QUERIES = {
+    '/metrics': "",
+    '/GetProfile': "id=0",  # benchmark_handler records a profile and uses its id
+    '/GetPlantList': "",
+    '/GetPlantInfos': "id=12",
+    '/GetPlantBesoins': "id=12",
+    '/GetPlantInterventions': "id_plante=12",
+    '/GetInterventionInfos': "id_intervention=2",
+    '/GetLatestIntervention': "id_plante=12",
+    '/GetPlantsOverview': "ids=11,12,13",
+    '/GetAllRapports': "id_plante=12",
+    '/GetRapport': "id_rapport=2024-05",
+    '/GetLatestRapport': "id_plante=12",
+    '/GetRapportAgrege': "id_plante=12&debut=2024-01-01&fin=2024-12-31",
+    '/GetHistorique': "id_plante=12&debut=2024-05-01&fin=2024-05-31&metrique=humidite",
+    '/GetListeMembre': "",
+    '/GetMembreInfos': "id_membre=2",
+    '/GetHierarchie': "",
+    '/GetAgendaClasse': "classe=2B",
+}
+
+# Further query strings for branches the sample of the route does not reach
+EXTRA_SAMPLE_QUERIES = [
+    # No legacy rapport row for this month, the plant is looked up in agregat
+    ('/GetRapport', "id_rapport=2025-01"),
+]
+
+# Endpoints whose purpose is to return a whole table, a scan is expected there
+FULL_LISTING_ROUTES = {'/GetPlantList'}
+
+SAMPLE_READING = {"id": "Card004", "temperature": 21.5, "light": 300, "ground_humidity": [40, 41, 42]}
+
+
+def full_scans(conn, statement):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    # Scanning a subquery or VALUES list already built in memory is fine, its own plan lines are checked
+    derived = {detail.split(" ", 1)[1] for _, _, _, detail in plan if detail.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    return [
+        detail for _, _, _, detail in plan
+        if detail.startswith("SCAN ") and " USING " not in detail
+        and not detail.startswith(("SCAN CONSTANT ROW", "SCAN (subquery"))
+        and not detail.endswith(" CONSTANT ROWS")
+        and detail[len("SCAN "):] not in derived
+        and " VIRTUAL TABLE " not in detail
+    ]
+
+
+def traced_statements(conn, action):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        action(conn.cursor())
+    finally:
+        conn.set_trace_callback(None)
+    return [statement for statement in statements if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "INSERT", "WITH"))]
+
+
+def check(conn, name, action, allow_scan=False):
+    failures = []
+    for statement in traced_statements(conn, action):
+        scans = full_scans(conn, statement)
+        if scans and not allow_scan:
+            failures.append((name, scans, " ".join(statement.split())))
+    status = "FAIL" if failures else "ok"
+    print(f"{status:<5} {name}")
+    return failures
+
+
+def check_statement_count(conn):
+    # Writes of /sensor-data are set-based: the number of statements must not grow with
+    # the plants of the card nor with the readings of a batch
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO carte_plante (Identifier, Id_Plante) SELECT 'CheckCard', Id FROM plante LIMIT 10")
+    large_card = cursor.rowcount
+    server.card_index.load(cursor)
+    requests = {
+        "1 reading on 2 plants": [SAMPLE_READING],
+        f"1 reading on {large_card} plants": [dict(SAMPLE_READING, id='CheckCard')],
+        "5 readings on 2 plants": [dict(SAMPLE_READING, timestamp=f"2024-06-0{day} 12:00:00") for day in range(1, 6)],
+    }
+    counts = {
+        name: len(traced_statements(conn, lambda cursor: server.ingest_readings(cursor, readings)))
+        for name, readings in requests.items()
+    }
+    server.card_index.invalidate()
+
+    status = "ok" if len(set(counts.values())) == 1 else "FAIL"
+    print(f"{status:<5} POST /sensor-data statements: {', '.join(f'{count} for {name}' for name, count in counts.items())}")
+    return [] if status == "ok" else [("POST /sensor-data", ["statement count grows with the request"], "")]
+
+
+def check_schema_file():
+    # SQL/database.sql is generated, it must be regenerated whenever a migration is added
+    with open(server.schema_path) as schema_file:
+        status = "ok" if schema_file.read() == server.schema_script() else "FAIL"
+    print(f"{status:<5} SQL/database.sql matches MIGRATIONS")
+    return [] if status == "ok" else [("SQL/database.sql", ["out of date, run python server.py schema"], "")]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server.db_path = os.path.join(temp_dir, "plant_tracking.db")
+        server.initialize_database()
+
+        conn = sqlite3.connect(server.db_path)
+        failures = []
+
+        samples = []
+        for (method, path), route in server.ROUTES.items():
+            if method != 'GET':
+                continue
+            if path not in SAMPLE_QUERIES:
+                failures.append((path, ["no sample query"], ""))
+                print(f"FAIL  {path} (no sample query)")
+                continue
+            samples.append((path, SAMPLE_QUERIES[path]))
+
+        for path, query in samples + EXTRA_SAMPLE_QUERIES:
+            route = server.ROUTES[('GET', path)]
+            params = route.parse_params(query)
+            failures += check(
+                conn, f"GET {path}?{urllib.parse.unquote(query)}",
+                lambda cursor, route=route, params=params: route.handler(None, cursor, params),
+                allow_scan=path in FULL_LISTING_ROUTES
+            )
+
+        # Cards are resolved from the in-memory index on the hot path
+        server.card_index.load(conn.cursor())
+        failures += check(conn, "POST /sensor-data", lambda cursor: server.ingest_readings(cursor, [SAMPLE_READING]))
+        conn.rollback()
+        failures += check_statement_count(conn)
+        conn.rollback()
+        conn.close()
+        failures += check_schema_file()
+
+    for name, scans, statement in failures:
+        print(f"\n{name}: {', '.join(scans)}\n  {statement}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,126 +1,955 @@
 import os
+import sys
+import textwrap
 import http.server
 import socketserver
+import socket
 import json
 import logging
+import logging.handlers
+import atexit
 import sqlite3
 import urllib.parse
 import datetime
 import base64
+import hashlib
+import gzip
+import zlib
+import tempfile
+import asyncio
+import signal
+import selectors
+import threading
+import time
+import queue
+import contextlib
+import bisect
+import math
+import functools
+import itertools
+import cProfile
+import pstats
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 PORT = 5000
 
+# "single" (one request at a time), "threaded" (worker pool) or "async" (asyncio accept loop)
+SERVER_MODE = "threaded"
+WORKER_COUNT = 16
+MAX_CONCURRENT_REQUESTS = 64
+SHUTDOWN_GRACE_SECONDS = 10
+
+# HTTP/1.1 persistent connections, an idle connection still holds a worker until it times out
+KEEP_ALIVE_TIMEOUT_SECONDS = 15
+MAX_REQUESTS_PER_CONNECTION = 100
+# Unread request bodies up to this size are discarded so the connection can be reused, larger ones close it
+MAX_DRAIN_BYTES = 64 * 1024
+
+MAX_BATCH_SIZE = 1000
+MAX_IMAGE_BYTES = 2 * 1024 * 1024
+IMAGE_CHUNK_SIZE = 64 * 1024
+# An image sent apart is attached to the latest reading of its card only if it was taken this shortly before
+PHOTO_READING_MAX_AGE_SECONDS = 300
+IMAGE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png'
+}
+
+# "sync" commits readings before answering, "write_behind" answers 202 once they are in the
+# append-only journal and leaves the database writes to one writer thread committing in groups
+INGEST_MODE = "sync"
+WRITE_BEHIND_BATCH_SIZE = 500
+WRITE_BEHIND_MAX_DELAY_SECONDS = 0.05
+WRITE_BEHIND_RETRY_SECONDS = 1
+JOURNAL_FSYNC = True
+# The journal starts over once everything in it is applied and it has grown past this size
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL_SECONDS = 60
+
+CARD_INDEX_TTL_SECONDS = 300
+
+# Rollup resolutions from finest to coarsest: (name, length of the Date_Mesure prefix, bucket width)
+ROLLUP_RESOLUTIONS = [
+    ('heure', 13, datetime.timedelta(hours=1)),
+    ('jour', 10, datetime.timedelta(days=1)),
+    ('mois', 7, datetime.timedelta(days=31)),
+]
+ROLLUP_METRICS = [('humidite', 'Humidite'), ('temperature', 'Temperature'), ('luminosite', 'Luminosite')]
+ROLLUP_MAX_POINTS = 400
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# "orjson" when installed, "json" forces the standard library encoder
+JSON_BACKEND = "orjson" if orjson else "json"
+# Arrays at least this long are streamed in chunks instead of encoded in one piece (and are not cached)
+JSON_STREAM_MIN_ITEMS = 500
+JSON_CHUNK_ITEMS = 100
+
+# Bodies smaller than this are sent as is, compressing them costs more than it saves
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_LEVEL = 6
+
+MIGRATION_BATCH_SIZE = 500
+MIGRATION_BATCH_PAUSE_SECONDS = 0.05
+
+DB_POOL_SIZE = WORKER_COUNT
+DB_POOL_TIMEOUT_SECONDS = 30
+DB_BUSY_TIMEOUT_MS = 5000
+# UPDATE ... FROM and AS MATERIALIZED in the ingest statements need SQLite 3.35
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+# Rows a database built from SQL/database.sql starts with, the migrations seed their own test data
+SCHEMA_DEFAULT_ROWS = """-- Default Values
+INSERT INTO classe (Nom_classe, Agenda) VALUES ('DE', 'Agenda DEFAULT');
+
+INSERT INTO membre (Cle_API, Nom, Prenom, Classe, Role_Association, Photo_profil, Date_inscription, Plante_Principale) 
+VALUES ('DEFAULT_API_KEY', 'Everyone', 'Everyone', 'DE', 'Everyone', 'everyone', '2024-01-01', NULL);
+
+INSERT INTO journal_ingestion (Id, Seq) VALUES (1, 0);
+"""
+DB_CACHE_SIZE_KB = 8192
+DB_MMAP_SIZE_BYTES = 64 * 1024 * 1024
+DB_STATEMENT_CACHE_SIZE = 128
+
+# "queue" hands records to a background writer thread, "sync" writes them from the request thread
+LOG_MODE = "queue"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Profiling of single requests, asked for with an "X-Profile: 1" header or a "profile=1" query flag
+# and only honored for members whose X-API-Key belongs to one of these roles
+PROFILE_ADMIN_ROLES = ('President', 'Vice President', 'Responsable Technique')
+PROFILE_KEEP = 50
+PROFILE_TOP_FUNCTIONS = 30
+
+# Upper bounds, in seconds, of the latency histogram buckets exposed on /metrics
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
 script_dir = os.path.dirname(os.path.abspath(__file__))
 log_path = os.path.join(script_dir, "server.log")
 db_path = os.path.join(script_dir, "plant_tracking.db")
 photos_dir = os.path.join(script_dir, "plant_photos")
+profiles_dir = os.path.join(script_dir, "profiles")
+journal_path = os.path.join(script_dir, "ingest_journal.ndjson")
+schema_path = os.path.join(script_dir, "..", "..", "SQL", "database.sql")
 
 os.makedirs(photos_dir, exist_ok=True)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_path),
+def configure_logging(mode=LOG_MODE):
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    handlers = [
+        logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT),
         logging.StreamHandler()
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if mode == "sync":
+        logging.basicConfig(level=logging.INFO, handlers=handlers)
+        return None
+
+    # Request threads only enqueue records, file and console I/O happen on the listener thread
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+log_listener = configure_logging()
+access_logger = logging.getLogger("access")
+
+class ConnectionPool:
+    def __init__(self, database, size=DB_POOL_SIZE):
+        self.database = database
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # check_same_thread is off because a connection moves between pool workers,
+        # but it is only ever used by one request at a time
+        conn = sqlite3.connect(
+            self.database,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=DB_POOL_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+db_pool = ConnectionPool(db_path)
+
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, tags, generation, headers=(), variants=None):
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        with self._lock:
+            # Skip responses computed before an invalidation, they may hold stale rows
+            if generation != self.generation:
+                return etag
+            # variants holds the compressed bodies, filled the first time an encoding is requested
+            self._entries[key] = (
+                body, etag, frozenset(tags), time.monotonic() + self.ttl, tuple(headers),
+                variants if variants is not None else {}
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            for key in [key for key, entry in self._entries.items() if entry[2] & tags]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+class CardIndex:
+    # Identifier -> plant ids, so ingestion resolves a card without a query. Cards added
+    # since the last load are looked up on miss, the whole index is reloaded after the TTL.
+    def __init__(self, ttl=CARD_INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self._plants = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self, cursor):
+        cursor.execute("""
+            SELECT Identifier, Id_Plante 
+            FROM carte_plante 
+            ORDER BY Identifier, Id_Plante
+        """)
+        plants = {}
+        for card_id, plant_id in cursor.fetchall():
+            plants.setdefault(card_id, []).append(plant_id)
+        with self._lock:
+            self._plants = plants
+            self._loaded_at = time.monotonic()
+
+    def get(self, cursor, card_id):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load(cursor)
+        plant_ids = self._plants.get(card_id)
+        if plant_ids is None:
+            cursor.execute("""
+                SELECT Id_Plante 
+                FROM carte_plante 
+                WHERE Identifier = ? 
+                ORDER BY Id_Plante
+            """, (card_id,))
+            plant_ids = [row[0] for row in cursor.fetchall()]
+            if plant_ids:
+                with self._lock:
+                    self._plants[card_id] = plant_ids
+        return plant_ids or None
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+card_index = CardIndex()
+
+
+class Metrics:
+    # Counters and histograms keyed by (name, labels), rendered in the Prometheus text format.
+    # Recording is a dict update under one lock, cheap enough to stay on the request path.
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("plant_stage_duration_seconds", (("stage", stage),), time.perf_counter() - started)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._histograms.items())
+
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels((*labels, ('le', str(bound))))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+@functools.lru_cache(maxsize=512)
+def query_label(sql):
+    return " ".join(sql.split())[:120]
+
+
+class TimedCursor(sqlite3.Cursor):
+    # Adds the time spent executing and fetching each statement to plant_sql_query_duration_seconds
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, started, max(self.rowcount, 0))
+
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self._record(sql, started, max(self.rowcount, 0))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = None
+        try:
+            row = super().fetchone()
+            return row
+        finally:
+            self._record(None, started, int(row is not None))
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = []
+        try:
+            rows = super().fetchall()
+            return rows
+        finally:
+            self._record(None, started, len(rows))
+
+    def _record(self, sql, started, rows):
+        if sql is not None:
+            self.last_query = query_label(sql)
+        metrics.observe("plant_sql_query_duration_seconds", (("query", self.last_query),), time.perf_counter() - started)
+
+
+class SqlTrace:
+    # Statements reported by set_trace_callback (with their bound values), paired with
+    # the time and row count measured by the ProfilingCursor that ran them
+    def __init__(self):
+        self.statements = []
+        self._pending = []
+
+    def on_statement(self, statement):
+        if statement.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+            self.statements.append({"sql": statement.strip(), "executions": 1, "duration_ms": 0.0, "rows": 0})
+        else:
+            self._pending.append(statement)
+
+    def record(self, sql, elapsed, rows):
+        if sql is None:
+            # Fetches belong to the last statement executed
+            if self.statements:
+                self.statements[-1]["duration_ms"] += elapsed * 1000
+                self.statements[-1]["rows"] += rows
+            return
+        self.statements.append({
+            "sql": " ".join((self._pending[0] if self._pending else sql).split()),
+            "executions": len(self._pending),
+            "duration_ms": elapsed * 1000,
+            "rows": rows
+        })
+        self._pending = []
+
+
+class ProfilingCursor(TimedCursor):
+    trace = None
+
+    def _record(self, sql, started, rows):
+        super()._record(sql, started, rows)
+        self.trace.record(sql, time.perf_counter() - started, rows)
+
+
+metrics = Metrics()
+profile_ids = itertools.count(1)
+
+
+def write_profile(profile_id, request_line, profiler, trace, duration):
+    os.makedirs(profiles_dir, exist_ok=True)
+    stats = pstats.Stats(profiler)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+    report = {
+        "id": profile_id,
+        "request": request_line,
+        "duration_ms": round(duration * 1000, 3),
+        "sql_ms": round(sum(statement["duration_ms"] for statement in trace.statements), 3),
+        "sql": [{**statement, "duration_ms": round(statement["duration_ms"], 3)} for statement in trace.statements],
+        "top_functions": [
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3)
+            }
+            for (filename, line, name), (_, calls, total, cumulative, _) in functions
+        ]
+    }
+    with open(os.path.join(profiles_dir, f"{profile_id}.json"), 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    # The raw stats can be opened with pstats or snakeviz
+    profiler.dump_stats(os.path.join(profiles_dir, f"{profile_id}.prof"))
+
+    # Profile ids sort by time, only the most recent PROFILE_KEEP are kept
+    reports = sorted(name[:-5] for name in os.listdir(profiles_dir) if name.endswith('.json'))
+    for old_id in reports[:-PROFILE_KEEP]:
+        for extension in ('.json', '.prof'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(profiles_dir, old_id + extension))
+    logging.info(f"Profile {profile_id} written for {request_line} ({report['duration_ms']} ms, {report['sql_ms']} ms SQL)")
+
+
+def invalidate_plant_responses(plant_ids):
+    if plant_ids:
+        response_cache.invalidate({f"plante:{plant_id}" for plant_id in plant_ids} | {"rapports"})
+
+
+class RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Route:
+    def __init__(self, method, path, handler, params, optional, cache_tags, not_found, paginated, admin, body):
+        self.method = method
+        self.path = path
+        self.handler = handler
+        self.params = params
+        self.optional = {**optional, 'limit': int, 'cursor': page_cursor} if paginated else optional
+        self.cache_tags = cache_tags
+        self.not_found = not_found
+        self.paginated = paginated
+        self.admin = admin
+        self.body = body
+
+    def parse_params(self, query):
+        raw = urllib.parse.parse_qs(query)
+        params = {}
+        for name, kind in self.params.items():
+            if not raw.get(name):
+                raise RequestError(400, f"Missing parameter: {name}")
+            params[name] = self.convert(name, kind, raw[name][0])
+        for name, kind in self.optional.items():
+            params[name] = self.convert(name, kind, raw[name][0]) if raw.get(name) else None
+        if self.paginated:
+            if params['limit'] is None:
+                params['limit'] = DEFAULT_PAGE_SIZE
+            elif not 1 <= params['limit'] <= MAX_PAGE_SIZE:
+                raise RequestError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        return params
+
+    @staticmethod
+    def convert(name, kind, value):
+        try:
+            # Integers bound to SQLite must fit in 64 bits, sqlite3 raises OverflowError otherwise
+            return int64(value) if kind is int else kind(value)
+        except ValueError:
+            raise RequestError(400, f"Invalid value for parameter {name}: {value}")
+
+    def describe(self):
+        query = "&".join(f"{name}={{{kind.__name__}}}" for name, kind in {**self.params, **self.optional}.items())
+        return f"{self.method} {self.path}" + (f"?{query}" if query else "")
+
+
+ROUTES = {}
+
+
+def route(method, path, params=None, optional=None, cache_tags=None, not_found="Not found", paginated=False,
+          admin=False, body=None):
+    # body reads the request body before a database connection is taken, its result is params['body']
+    def register(handler):
+        ROUTES[(method, path)] = Route(
+            method, path, handler, params or {}, optional or {}, cache_tags, not_found, paginated, admin, body
+        )
+        return handler
+    return register
+
+
+class Page(list):
+    # A page of a list endpoint, next_cursor is sent in the X-Next-Cursor header
+    next_cursor = None
+
+
+def page_cursor(value):
+    # Opaque token holding the sort key of the last row of the previous page
+    key = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+    if not isinstance(key, list) or not all(is_key_value(element) for element in key):
+        raise ValueError(value)
+    return key
+
+
+def is_key_value(value):
+    # Only what a sort column can hold, anything else would fail when bound to the query
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return isinstance(value, (str, float))
+
+
+def encode_page_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def keyset_condition(columns, key, descending=False):
+    # Row value comparison against the cursor, so each page is an index range instead of an OFFSET
+    if key is None:
+        return "1", []
+    if len(key) != len(columns):
+        raise RequestError(400, "Invalid cursor")
+    return f"({', '.join(columns)}) {'<' if descending else '>'} ({', '.join('?' * len(columns))})", key
+
+
+def paginate(rows, limit, convert, key_of):
+    # rows were fetched with LIMIT limit + 1, the extra row only tells whether a next page exists
+    page = convert(rows[:limit])
+    if not isinstance(page, Page):
+        page = Page(page)
+    if len(rows) > limit:
+        page.next_cursor = encode_page_cursor(key_of(rows[limit - 1]))
+    return page
+
+
+def timestamp(value):
+    return datetime.datetime.fromisoformat(value).replace(tzinfo=None)
+
+
+class JsonRows(Page):
+    # Rows serialized by SQLite's json_object, the last column of each row; they are joined
+    # into the response as is, without building a dict per row
+    pass
+
+
+def json_object_sql(keys, columns):
+    pairs = ', '.join(f"'{key}', {column}" for key, column in zip(keys, columns))
+    return f"json_object({pairs})"
+
+
+def json_rows(rows):
+    return JsonRows(row[-1] for row in rows)
+
+
+def encode_json(data):
+    if isinstance(data, JsonRows):
+        return f"[{','.join(data)}]".encode('utf-8')
+    if JSON_BACKEND == "orjson":
+        return orjson.dumps(data)
+    return json.dumps(data).encode('utf-8')
+
+
+def json_chunks(items, chunk_items=JSON_CHUNK_ITEMS):
+    yield b'['
+    for start in range(0, len(items), chunk_items):
+        chunk = items[start:start + chunk_items]
+        body = ','.join(chunk).encode('utf-8') if isinstance(items, JsonRows) else encode_json(chunk)[1:-1]
+        yield (b',' if start else b'') + body
+    yield b']'
+
+
+def compress_body(body, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output, and so the cached variant, deterministic
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL, mtime=0)
+    return zlib.compress(body, COMPRESSION_LEVEL)
+
+
+def compress_chunks(chunks, encoding):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+class TextResponse(str):
+    # Non-JSON body returned by a route handler, sent as is and never cached
+    content_type = 'text/plain; charset=utf-8'
+
+
+class PrometheusText(TextResponse):
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class AcceptedResponse(dict):
+    # Sent with 202: the request is durable but not applied to the database yet
+    pass
+
+
+def int64(value):
+    number = int(value)
+    if not -2 ** 63 <= number < 2 ** 63:
+        raise ValueError(value)
+    return number
+
+
+def id_list(value):
+    return [int64(item) for item in value.split(',') if item.strip()]
+
+
+def rows_to_dicts(keys, rows):
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def row_to_dict(keys, row):
+    return dict(zip(keys, row)) if row else None
+
+
+class RequestBody:
+    # Reads at most Content-Length bytes from the connection, so a handler can never
+    # run into the next request and whatever it leaves unread can be drained afterwards
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(size) if size else b''
+        self.remaining = self.remaining - len(data) if data else 0
+        return data
+
+    def readline(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.readline(size) if size else b''
+        self.remaining = self.remaining - len(data) if data else 0
+        return data
+
+    def drain(self):
+        if self.remaining > MAX_DRAIN_BYTES:
+            return False
+        while self.read(IMAGE_CHUNK_SIZE):
+            pass
+        return True
+
+
+class CountingWriter:
+    # Wraps the connection's write stream to count the bytes of each response
+    def __init__(self, stream):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+    @property
+    def closed(self):
+        return self.stream.closed
+
 
 class PlantTrackingHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT_SECONDS
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+        self.requests_served = 0
+        self.idle = True
+        self.keep_open = False
+        if hasattr(self.server, 'track_connection'):
+            self.server.track_connection(self, True)
+
+    def finish(self):
+        if self.keep_open:
+            # Parked with the server until the next request arrives
+            return
+        if hasattr(self.server, 'track_connection'):
+            self.server.track_connection(self, False)
+        super().finish()
+
+    def handle(self):
+        # Serves the requests already sent on the connection. A server with idle connection
+        # parking gets the connection back in between, so waiting for the client holds no worker
+        self.keep_open = False
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if hasattr(self.server, 'park_connection') and not self.has_pending_input():
+                self.keep_open = True
+                return
+            self.handle_one_request()
+
+    def resume(self):
+        try:
+            self.handle()
+        finally:
+            self.finish()
+
+    def has_pending_input(self):
+        # Pipelined bytes already buffered by rfile would never wake the selector
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def handle_one_request(self):
+        self.idle = True
+        self.requests_served += 1
+        self.started_at = None
+        self.response_code = None
+        self.route_label = "unmatched"
+        written = self.wfile.written
+        super().handle_one_request()
+        if self.started_at is not None:
+            bytes_sent = self.wfile.written - written
+            self.log_access(bytes_sent)
+            self.record_metrics(bytes_sent)
+
+    def parse_request(self):
+        self.idle = False
+        self.started_at = time.perf_counter()
+        return super().parse_request()
+
+    def log_request(self, code='-', size='-'):
+        # Called by send_response, the access line is written once the response is complete
+        self.response_code = code
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+    def record_metrics(self, bytes_sent):
+        route = (("route", self.route_label),)
+        # headers is not set when the header block itself was rejected, e.g. 431 for too many lines
+        headers = getattr(self, 'headers', None)
+        length = headers.get('Content-Length', '') if self.command and headers is not None else ''
+        metrics.inc("plant_http_requests_total", (*route, ("method", self.command or "-"), ("status", str(int(self.response_code or 0)))))
+        metrics.observe("plant_http_request_duration_seconds", route, time.perf_counter() - self.started_at)
+        metrics.inc("plant_http_response_bytes_total", route, bytes_sent)
+        if length.isdigit():
+            metrics.inc("plant_http_request_bytes_total", route, int(length))
+
+    def log_access(self, bytes_sent):
+        duration_ms = (time.perf_counter() - self.started_at) * 1000
+        # command is reset for every request line, path is only set once the line parses
+        method = getattr(self, 'command', None)
+        access_logger.info(
+            f"client={self.client_address[0]} method={method or '-'} "
+            f"path={json.dumps(self.path if method else '-')} status={int(self.response_code or 0)} "
+            f"bytes={bytes_sent} duration_ms={duration_ms:.2f}"
+        )
+
+    def end_headers(self):
+        if getattr(self, 'profile_id', None):
+            self.send_header('X-Profile-Id', self.profile_id)
+            self.profile_id = None
+        if not getattr(self.server, 'supports_keep_alive', False) or self.requests_served >= MAX_REQUESTS_PER_CONNECTION:
+            self.close_connection = True
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        else:
+            self.send_header('Keep-Alive', f"timeout={KEEP_ALIVE_TIMEOUT_SECONDS}, max={MAX_REQUESTS_PER_CONNECTION - self.requests_served}")
+        super().end_headers()
+
+    def discard_body(self):
+        if isinstance(self.rfile, RequestBody) and self.rfile.remaining and not self.rfile.drain():
+            self.close_connection = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
     def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        connection_stream = self.rfile
         try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
+            length = self.headers.get('Content-Length')
+            if length is not None and length.isdigit():
+                self.rfile = RequestBody(connection_stream, int(length))
+            elif method == 'POST':
+                # Without a length the end of the body is unknown, the connection cannot be reused
+                self.close_connection = True
 
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            sensor_data = json.loads(post_data.decode('utf-8'))
+            parsed_path = urllib.parse.urlparse(self.path)
+            matched = ROUTES.get((method, parsed_path.path))
+            if matched is not None:
+                self.route_label = matched.path
+            if matched is None:
+                self.send_error_response(404, "Endpoint not found")
+                return
 
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
+            params = matched.parse_params(parsed_path.query)
 
-            if path == '/sensor-data':
-                cursor.execute("""
-                    SELECT c.Plantes 
-                    FROM Cartes c 
-                    WHERE c.Identifier = ?
-                """, (sensor_data['id'],))
-                card_result = cursor.fetchone()
+            profiling = (
+                self.headers.get('X-Profile', '') == '1'
+                or urllib.parse.parse_qs(parsed_path.query).get('profile') == ['1']
+            )
+            if matched.admin or profiling:
+                self.require_admin()
 
-                if not card_result:
-                    self.send_error_response(404, "No card found with this identifier")
+            self.cache_key = None
+            if matched.cache_tags and not profiling:
+                cache_key = f"{matched.path}?{urllib.parse.urlencode(sorted(params.items()))}"
+                cached = response_cache.get(cache_key)
+                metrics.inc("plant_response_cache_total", (("result", "hit" if cached else "miss"),))
+                if cached:
+                    self.send_body(cached[0], cached[1], cached[4], cached[5])
                     return
+                self.cache_key = cache_key
+                self.cache_tags = matched.cache_tags(params)
+                self.cache_generation = response_cache.generation
 
-                plant_ids = [int(pid) for pid in card_result[0].split(',')]
-
-                for plant_id in plant_ids:
-                    cursor.execute("""
-                        UPDATE plante 
-                        SET 
-                            Temperature = ?, 
-                            Luminosite = ?,
-                            Derniere_Photo = ?
-                        WHERE Id = ?
-                    """, (
-                        sensor_data['temperature'], 
-                        sensor_data['light'], 
-                        f"{plant_id}/{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
-                        plant_id
-                    ))
-
-                    ground_humidity = sensor_data.get('ground_humidity', [])
-                    if isinstance(ground_humidity, list) and ground_humidity:
-                        cursor.execute("""
-                            UPDATE plante 
-                            SET Humidite = ? 
-                            WHERE Id = ?
-                        """, (ground_humidity[0], plant_id))
-
-                    if sensor_data.get('image'):
-                        plant_photo_dir = os.path.join(photos_dir, str(plant_id))
-                        os.makedirs(plant_photo_dir, exist_ok=True)
-                        
-                        image_path = os.path.join(
-                            plant_photo_dir, 
-                            f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                        )
-                        
-                        with open(image_path, 'wb') as image_file:
-                            image_file.write(base64.b64decode(sensor_data['image']))
-
-                    current_month = datetime.datetime.now().strftime('%Y-%m')
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO rapport (
-                            Date_Rapport, 
-                            Id_Plante, 
-                            Histo_Hum, 
-                            Histo_Temp, 
-                            Histo_Lum, 
-                            Histo_Photo
-                        ) VALUES (
-                            ?, ?, 
-                            (SELECT COALESCE(Histo_Hum, '') || ',' || ? FROM rapport WHERE Date_Rapport = ? AND Id_Plante = ?), 
-                            (SELECT COALESCE(Histo_Temp, '') || ',' || ? FROM rapport WHERE Date_Rapport = ? AND Id_Plante = ?), 
-                            (SELECT COALESCE(Histo_Lum, '') || ',' || ? FROM rapport WHERE Date_Rapport = ? AND Id_Plante = ?), 
-                            ?
-                        )
-                    """, (
-                        current_month, plant_id, 
-                        ground_humidity[0] if ground_humidity else 0, current_month, plant_id,
-                        sensor_data['temperature'], current_month, plant_id,
-                        sensor_data['light'], current_month, plant_id,
-                        f"{plant_id}/{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                    ))
-
-                conn.commit()
-                
-                self.send_json_response({"status": "success", "plants_updated": len(plant_ids)})
+            if matched.body:
+                # A slow upload must not hold one of the pooled connections
+                params['body'] = matched.body(self, params)
 
+            if profiling:
+                self.respond_profiled(matched, params)
             else:
-                self.send_error_response(404, "Endpoint not found")
-
-            conn.close()
+                self.respond(matched, params)
 
+        except RequestError as e:
+            self.send_error_response(e.code, e.message)
         except sqlite3.Error as e:
             logging.error(f"Database error: {e}")
             self.send_error_response(500, f"Database error: {str(e)}")
@@ -129,313 +958,1559 @@ class PlantTrackingHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error_response(400, "Invalid JSON data")
         except Exception as e:
             logging.error(f"Unexpected error: {e}")
+            # The failure may have left a partial response on the wire
+            self.close_connection = True
             self.send_error_response(500, f"Unexpected server error: {str(e)}")
+        finally:
+            self.discard_body()
+            self.rfile = connection_stream
 
-    def do_GET(self):
+    def respond(self, matched, params, trace=None):
+        with db_pool.connection() as conn:
+            if trace is None:
+                cursor = conn.cursor(TimedCursor)
+            else:
+                cursor = conn.cursor(ProfilingCursor)
+                cursor.trace = trace
+                conn.set_trace_callback(trace.on_statement)
+            try:
+                data = matched.handler(self, cursor, params)
+            finally:
+                conn.set_trace_callback(None)
+
+        if data is None:
+            self.send_error_response(404, matched.not_found)
+        else:
+            self.send_json_response(data)
+
+    def respond_profiled(self, matched, params):
+        # The id is known up front so it can be sent in the response headers
+        profile_id = self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(profile_ids):04d}"
+        trace = SqlTrace()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
         try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
-            params = urllib.parse.parse_qs(parsed_path.query)
-
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            if path == '/GetPlantList':
-                cursor.execute("SELECT Id, Nom FROM plante")
-                results = cursor.fetchall()
-                self.send_json_response([{"id": row[0], "nom": row[1]} for row in results])
-
-            elif path == '/GetPlantInfos':
-                plant_id = params.get('id', [None])[0]
-                if plant_id:
-                    cursor.execute("""
-                        SELECT Id, Nom, Type_Plante, Localisation, Humidite, Temperature, Luminosite, Derniere_Photo 
-                        FROM plante 
-                        WHERE Id = ?
-                    """, (plant_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "id": row[0], "nom": row[1], "type_plante": row[2], 
-                            "localisation": row[3], "humidite": row[4], 
-                            "temperature": row[5], "luminosite": row[6], 
-                            "derniere_photo": row[7]
-                        })
-                    else:
-                        self.send_error_response(404, "Plant not found")
-
-            elif path == '/GetPlantBesoins':
-                plant_id = params.get('id', [None])[0]
-                if plant_id:
-                    cursor.execute("""
-                        SELECT statut, superviseur, 
-                        (SELECT date_intervention FROM intervention 
-                         WHERE Id_Plante = plante.Id 
-                         ORDER BY date_intervention DESC LIMIT 1) as last_intervention_date
-                        FROM plante 
-                        WHERE Id = ?
-                    """, (plant_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "statut": row[0], 
-                            "superviseur": row[1], 
-                            "derniere_intervention": row[2]
-                        })
-                    else:
-                        self.send_error_response(404, "Plant not found")
-
-            elif path == '/GetPlantInterventions':
-                plant_id = params.get('id_plante', [None])[0]
-                if plant_id:
-                    cursor.execute("""
-                        SELECT date_intervention, Id 
-                        FROM intervention 
-                        WHERE Id_Plante = ?
-                    """, (plant_id,))
-                    results = cursor.fetchall()
-                    self.send_json_response([
-                        {"date_intervention": row[0], "id": row[1]} 
-                        for row in results
-                    ])
-
-            elif path == '/GetInterventionInfos':
-                intervention_id = params.get('id_intervention', [None])[0]
-                if intervention_id:
-                    cursor.execute("""
-                        SELECT membre.Nom, id_intervenant, role_association, 
-                               id_plante, plante.Nom, note, intervention.Id
-                        FROM intervention
-                        JOIN plante ON plante.Id = id_plante
-                        JOIN membre ON membre.Id = id_intervenant
-                        WHERE intervention.Id = ?
-                    """, (intervention_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "nom_intervenant": row[0], 
-                            "id_intervenant": row[1], 
-                            "role_intervenant": row[2],
-                            "id_plante": row[3], 
-                            "nom_plante": row[4], 
-                            "note": row[5], 
-                            "id_intervention": row[6]
-                        })
-                    else:
-                        self.send_error_response(404, "Intervention not found")
-
-            elif path == '/GetLatestIntervention':
-                plant_id = params.get('id_plante', [None])[0]
-                if plant_id:
-                    cursor.execute("""
-                        SELECT membre.Nom, id_intervenant, role_association, 
-                               plante.Nom, id_plante, note, intervention.Id
-                        FROM intervention
-                        JOIN plante ON plante.Id = id_plante
-                        JOIN membre ON membre.Id = id_intervenant
-                        WHERE Id_Plante = ?
-                        ORDER BY date_intervention DESC 
-                        LIMIT 1
-                    """, (plant_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "nom_intervenant": row[0], 
-                            "id_intervenant": row[1], 
-                            "role_intervenant": row[2],
-                            "nom_plante": row[3], 
-                            "id_plante": row[4], 
-                            "note": row[5], 
-                            "id_intervention": row[6]
-                        })
-                    else:
-                        self.send_error_response(404, "No intervention found for this plant")
-
-            elif path == '/GetAllRapports':
-                plant_id = params.get('id_plante', [None])[0]
-                if plant_id:
-                    cursor.execute("""
-                        SELECT Id, Date_Rapport 
-                        FROM rapport 
-                        WHERE Id_Plante = ? 
-                        ORDER BY Date_Rapport DESC
-                    """, (plant_id,))
-                    results = cursor.fetchall()
-                    self.send_json_response([
-                        {"id": row[0], "date_rapport": row[1]} 
-                        for row in results
-                    ])
-
-            elif path == '/GetRapport':
-                rapport_id = params.get('id_rapport', [None])[0]
-                if rapport_id:
-                    cursor.execute("""
-                        SELECT Date_Rapport, Histo_Hum, Histo_Temp, Histo_Lum, Histo_Photo 
-                        FROM rapport 
-                        WHERE Date_Rapport = ?
-                    """, (rapport_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "date_rapport": row[0], 
-                            "historique_humidite": row[1], 
-                            "historique_temperature": row[2], 
-                            "historique_luminosite": row[3], 
-                            "photo": row[4]
-                        })
-                    else:
-                        self.send_error_response(404, "Rapport not found")
-
-            elif path == '/GetLatestRapport':
-                plant_id = params.get('id_plante', [None])[0]
-                if plant_id:
-                    cursor.execute("""
-                        SELECT Date_Rapport, Histo_Hum, Histo_Temp, Histo_Lum, Histo_Photo 
-                        FROM rapport 
-                        WHERE Id_Plante = ? 
-                        ORDER BY Date_Rapport DESC 
-                        LIMIT 1
-                    """, (plant_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "date_rapport": row[0], 
-                            "historique_humidite": row[1], 
-                            "historique_temperature": row[2], 
-                            "historique_luminosite": row[3], 
-                            "photo": row[4]
-                        })
-                    else:
-                        self.send_error_response(404, "No rapport found for this plant")
-
-            elif path == '/GetListeMembre':
-                cursor.execute("""
-                    SELECT Id, Nom, Prenom, Classe, Role_Association 
-                    FROM membre 
-                    ORDER BY Classe, Nom
-                """)
-                results = cursor.fetchall()
-                self.send_json_response([{
-                    "id": row[0], "nom": row[1], "prenom": row[2], 
-                    "classe": row[3], "role": row[4]
-                } for row in results])
-
-            elif path == '/GetMembreInfos':
-                membre_id = params.get('id_membre', [None])[0]
-                if membre_id:
-                    cursor.execute("""
-                        SELECT 
-                            m.Nom, 
-                            m.Prenom, 
-                            m.Classe, 
-                            m.Role_Association, 
-                            m.Date_inscription,
-                            (julianday('now') - julianday(m.Date_inscription)) / 365.25 AS Anciennete,
-                            p.Nom AS Plante_Principale,
-                            (SELECT COUNT(*) FROM intervention WHERE Id_intervenant = m.Id) AS Nombre_Interventions
-                        FROM 
-                            membre m
-                        LEFT JOIN 
-                            plante p ON m.Plante_Principale = p.Id
-                        WHERE 
-                            m.Id = ?
-                    """, (membre_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({
-                            "nom": row[0], 
-                            "prenom": row[1], 
-                            "classe": row[2], 
-                            "role": row[3], 
-                            "date_inscription": row[4],
-                            "anciennete_annees": round(row[5], 2),
-                            "plante_principale": row[6],
-                            "nombre_interventions": row[7]
-                        })
-                    else:
-                        self.send_error_response(404, "Member not found")
-
-            elif path == '/GetHierarchie':
-                cursor.execute("""
-                    SELECT Nom, Prenom, Role_Association 
-                    FROM membre 
-                    WHERE Role_Association IN (
-                        'President', 
-                        'Vice President', 
-                        'Secrétaire', 
-                        'Trésorier', 
-                        'Responsable Communication'
-                    ) 
-                    ORDER BY 
-                        CASE Role_Association 
-                            WHEN 'President' THEN 1 
-                            WHEN 'Vice President' THEN 2 
-                            WHEN 'Secrétaire' THEN 3 
-                            WHEN 'Trésorier' THEN 4 
-                            WHEN 'Responsable Communication' THEN 5 
-                        END
-                """)
-                results = cursor.fetchall()
-                self.send_json_response([{
-                    "nom": row[0], "prenom": row[1], "role": row[2]
-                } for row in results])
-
-            elif path == '/GetAgendaClasse':
-                classe = params.get('classe', [None])[0]
-                if classe:
-                    cursor.execute("""
-                        SELECT Agenda 
-                        FROM classe 
-                        WHERE Nom_classe = ?
-                    """, (classe,))
-                    row = cursor.fetchone()
-                    if row:
-                        self.send_json_response({"agenda": row[0]})
-                    else:
-                        self.send_error_response(404, "Classe not found")
+            self.respond(matched, params, trace)
+        finally:
+            profiler.disable()
+            write_profile(profile_id, self.requestline, profiler, trace, time.perf_counter() - started)
 
-            else:
-                self.send_error_response(404, "Endpoint not found")
+    def require_admin(self):
+        api_key = self.headers.get('X-API-Key')
+        if not api_key:
+            raise RequestError(401, "X-API-Key required")
+        with db_pool.connection() as conn:
+            member = conn.execute("SELECT Role_Association FROM membre WHERE Cle_API = ?", (api_key,)).fetchone()
+        if member is None or member[0] not in PROFILE_ADMIN_ROLES:
+            raise RequestError(403, "Admin access required")
 
-            conn.close()
+    @property
+    def content_length(self):
+        try:
+            return int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            raise RequestError(411, "Content-Length required")
 
-        except sqlite3.Error as e:
-            logging.error(f"Database error: {e}")
-            self.send_error_response(500, f"Database error: {str(e)}")
-        except Exception as e:
-            logging.error(f"Unexpected error: {e}")
-            self.send_error_response(500, f"Unexpected server error: {str(e)}")
+    @property
+    def content_type(self):
+        return self.headers.get('Content-Type', '').split(';')[0].strip()
+
+    def read_json_body(self, params):
+        return json.loads(self.rfile.read(self.content_length).decode('utf-8'))
+
+    def read_readings_body(self, params):
+        if self.content_type in ('application/x-ndjson', 'application/jsonl'):
+            return read_ndjson(self.rfile, self.content_length)
+        readings = self.read_json_body(params)
+        return readings.get('readings') if isinstance(readings, dict) else readings
+
+    def read_image_body(self, params):
+        # The image is streamed to the photo store, only the card lookup uses a connection
+        content_length = self.content_length
+        if self.content_type not in IMAGE_EXTENSIONS:
+            raise RequestError(415, f"Unsupported image type: {self.content_type}")
+        if content_length > MAX_IMAGE_BYTES:
+            raise RequestError(413, f"Image is limited to {MAX_IMAGE_BYTES} bytes")
+
+        with db_pool.connection() as conn:
+            plant_ids = card_plant_ids(conn.cursor(TimedCursor), params['id'])
+        if not plant_ids:
+            raise RequestError(404, "No card found with this identifier")
+
+        captured_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        stored_photo = store_photo_stream(self.rfile, content_length, IMAGE_EXTENSIONS[self.content_type])
+        return plant_ids, stored_photo, captured_at
+
+    @route('POST', '/sensor-data', body=read_json_body)
+    def post_sensor_data(self, cursor, params):
+        sensor_data = params['body']
+
+        if ingest_queue is not None:
+            result = journal_readings(cursor, [sensor_data])[0]
+            if result["status"] != "accepted":
+                raise RequestError(result.get("code", 400), result["error"])
+            return AcceptedResponse(status="accepted", plants_updated=result["plants_updated"], seq=result["seq"])
+
+        results, plant_ids = ingest_readings(cursor, [sensor_data])
+        cursor.connection.commit()
+        invalidate_plant_responses(plant_ids)
+
+        result = results[0]
+        if result["status"] != "success":
+            raise RequestError(result.get("code", 400), result["error"])
+        return {"status": "success", "plants_updated": result["plants_updated"]}
+
+    @route('POST', '/sensor-data/image', params={'id': str}, body=read_image_body)
+    def post_sensor_image(self, cursor, params):
+        plant_ids, stored_photo, captured_at = params['body']
+
+        if ingest_queue is not None:
+            # Journaled behind the reading it belongs to, the writer applies both in order
+            seq = ingest_queue.append([{"image": params['id'], "captured_at": captured_at, "photo": stored_photo}])[0]
+            return AcceptedResponse(status="accepted", plants_updated=len(plant_ids), seq=seq)
+
+        attach_photo(cursor, plant_ids, stored_photo, captured_at)
+        cursor.connection.commit()
+        invalidate_plant_responses(plant_ids)
+
+        return {"status": "success", "plants_updated": len(plant_ids)}
+
+    @route('POST', '/sensor-data/batch', body=read_readings_body)
+    def post_sensor_data_batch(self, cursor, params):
+        readings = params['body']
+        if not isinstance(readings, list):
+            raise RequestError(400, "Expected an array of readings")
+        if len(readings) > MAX_BATCH_SIZE:
+            raise RequestError(413, f"Batch is limited to {MAX_BATCH_SIZE} readings")
+
+        if ingest_queue is not None:
+            results = journal_readings(cursor, readings)
+            success = "accepted"
+        else:
+            results, plant_ids = ingest_readings(cursor, readings)
+            cursor.connection.commit()
+            invalidate_plant_responses(plant_ids)
+            success = "success"
+
+        accepted = sum(1 for result in results if result["status"] == success)
+        response = {
+            "status": success if accepted == len(results) else "partial",
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "results": results
+        }
+        return AcceptedResponse(response) if success == "accepted" and accepted else response
+
+    @route('GET', '/metrics')
+    def get_metrics(self, cursor, params):
+        return PrometheusText(metrics.render())
+
+    @route('GET', '/GetProfile', params={'id': str}, admin=True, not_found="Profile not found")
+    def get_profile(self, cursor, params):
+        if not params['id'].replace('-', '').isdigit():
+            return None
+        try:
+            with open(os.path.join(profiles_dir, f"{params['id']}.json")) as report_file:
+                return json.load(report_file)
+        except FileNotFoundError:
+            return None
+
+    @route('GET', '/GetPlantList', cache_tags=lambda params: {"plantes"}, paginated=True)
+    def get_plant_list(self, cursor, params):
+        condition, key = keyset_condition(("Id",), params['cursor'])
+        cursor.execute(f"""
+            SELECT Id, {json_object_sql(("id", "nom"), ("Id", "Nom"))} 
+            FROM plante 
+            WHERE {condition} 
+            ORDER BY Id 
+            LIMIT ?
+        """, (*key, params['limit'] + 1))
+        return paginate(cursor.fetchall(), params['limit'], json_rows, lambda row: [row[0]])
+
+    @route('GET', '/GetPlantInfos', params={'id': int},
+           cache_tags=lambda params: {f"plante:{params['id']}"}, not_found="Plant not found")
+    def get_plant_infos(self, cursor, params):
+        cursor.execute("""
+            SELECT Id, Nom, Type_Plante, Localisation, Humidite, Temperature, Luminosite, Derniere_Photo 
+            FROM plante 
+            WHERE Id = ?
+        """, (params['id'],))
+        return row_to_dict(
+            ("id", "nom", "type_plante", "localisation", "humidite", "temperature", "luminosite", "derniere_photo"),
+            cursor.fetchone()
+        )
+
+    @route('GET', '/GetPlantBesoins', params={'id': int},
+           cache_tags=lambda params: {f"plante:{params['id']}", "interventions"}, not_found="Plant not found")
+    def get_plant_besoins(self, cursor, params):
+        cursor.execute("""
+            SELECT statut, superviseur, 
+            (SELECT date_intervention FROM intervention 
+             WHERE Id_Plante = plante.Id 
+             ORDER BY date_intervention DESC LIMIT 1) as last_intervention_date
+            FROM plante 
+            WHERE Id = ?
+        """, (params['id'],))
+        return row_to_dict(("statut", "superviseur", "derniere_intervention"), cursor.fetchone())
+
+    @route('GET', '/GetPlantInterventions', params={'id_plante': int},
+           cache_tags=lambda params: {"interventions"}, paginated=True)
+    def get_plant_interventions(self, cursor, params):
+        condition, key = keyset_condition(("Id",), params['cursor'])
+        cursor.execute(f"""
+            SELECT Id, {json_object_sql(("date_intervention", "id"), ("date_intervention", "Id"))} 
+            FROM intervention 
+            WHERE Id_Plante = ? AND {condition} 
+            ORDER BY Id 
+            LIMIT ?
+        """, (params['id_plante'], *key, params['limit'] + 1))
+        return paginate(cursor.fetchall(), params['limit'], json_rows, lambda row: [row[0]])
+
+    @route('GET', '/GetInterventionInfos', params={'id_intervention': int},
+           cache_tags=lambda params: {"interventions"}, not_found="Intervention not found")
+    def get_intervention_infos(self, cursor, params):
+        cursor.execute("""
+            SELECT membre.Nom, id_intervenant, role_association, 
+                   id_plante, plante.Nom, note, intervention.Id
+            FROM intervention
+            JOIN plante ON plante.Id = id_plante
+            JOIN membre ON membre.Id = id_intervenant
+            WHERE intervention.Id = ?
+        """, (params['id_intervention'],))
+        return row_to_dict(
+            ("nom_intervenant", "id_intervenant", "role_intervenant", "id_plante", "nom_plante", "note", "id_intervention"),
+            cursor.fetchone()
+        )
+
+    @route('GET', '/GetLatestIntervention', params={'id_plante': int},
+           cache_tags=lambda params: {"interventions"}, not_found="No intervention found for this plant")
+    def get_latest_intervention(self, cursor, params):
+        cursor.execute("""
+            SELECT membre.Nom, id_intervenant, role_association, 
+                   plante.Nom, id_plante, note, intervention.Id
+            FROM intervention
+            JOIN plante ON plante.Id = id_plante
+            JOIN membre ON membre.Id = id_intervenant
+            WHERE Id_Plante = ?
+            ORDER BY date_intervention DESC 
+            LIMIT 1
+        """, (params['id_plante'],))
+        return row_to_dict(
+            ("nom_intervenant", "id_intervenant", "role_intervenant", "nom_plante", "id_plante", "note", "id_intervention"),
+            cursor.fetchone()
+        )
+
+    @route('GET', '/GetPlantsOverview', optional={'ids': id_list},
+           cache_tags=lambda params: (
+               {f"plante:{plant_id}" for plant_id in params['ids']} | {"interventions"} if params['ids']
+               else {"plantes", "rapports", "interventions"}
+           ),
+           paginated=True)
+    def get_plants_overview(self, cursor, params):
+        # Infos, besoins and latest intervention of a page of plants in three queries,
+        # instead of one request per plant and per endpoint
+        condition, key = keyset_condition(("Id",), params['cursor'])
+        if params['ids'] is not None:
+            condition += " AND Id IN (SELECT value FROM json_each(?))"
+            key = [*key, json.dumps(params['ids'])]
+        cursor.execute(f"""
+            SELECT Id, Nom, Type_Plante, Localisation, Humidite, Temperature, Luminosite, Derniere_Photo, statut, superviseur 
+            FROM plante 
+            WHERE {condition} 
+            ORDER BY Id 
+            LIMIT ?
+        """, (*key, params['limit'] + 1))
+        rows = cursor.fetchall()
+        plant_ids = json.dumps([row[0] for row in rows[:params['limit']]])
+
+        cursor.execute("""
+            SELECT Id_Plante, MAX(date_intervention) 
+            FROM intervention 
+            WHERE Id_Plante IN (SELECT value FROM json_each(?)) 
+            GROUP BY Id_Plante
+        """, (plant_ids,))
+        last_dates = dict(cursor.fetchall())
+
+        cursor.execute("""
+            SELECT Nom_Intervenant, id_intervenant, role_association, plante.Nom, id_plante, note, Id_Intervention
+            FROM (
+                SELECT intervention.Id AS Id_Intervention, membre.Nom AS Nom_Intervenant, id_intervenant, role_association, id_plante, note, 
+                       ROW_NUMBER() OVER (PARTITION BY id_plante ORDER BY date_intervention DESC, intervention.Id DESC) AS Rang
+                FROM intervention
+                JOIN membre ON membre.Id = id_intervenant
+                WHERE Id_Plante IN (SELECT value FROM json_each(?))
+            )
+            JOIN plante ON plante.Id = id_plante
+            WHERE Rang = 1
+        """, (plant_ids,))
+        latest_interventions = {
+            row[4]: row_to_dict(
+                ("nom_intervenant", "id_intervenant", "role_intervenant", "nom_plante", "id_plante", "note", "id_intervention"),
+                row
+            )
+            for row in cursor.fetchall()
+        }
+
+        return paginate(rows, params['limit'], lambda rows: [
+            {
+                "id": row[0],
+                "infos": row_to_dict(
+                    ("id", "nom", "type_plante", "localisation", "humidite", "temperature", "luminosite", "derniere_photo"),
+                    row[:8]
+                ),
+                "besoins": {"statut": row[8], "superviseur": row[9], "derniere_intervention": last_dates.get(row[0])},
+                "derniere_intervention": latest_interventions.get(row[0])
+            }
+            for row in rows
+        ], lambda row: [row[0]])
+
+    @route('GET', '/GetAllRapports', params={'id_plante': int},
+           cache_tags=lambda params: {f"plante:{params['id_plante']}"}, paginated=True)
+    def get_all_rapports(self, cursor, params):
+        condition, key = keyset_condition(("Periode",), params['cursor'], descending=True)
+        cursor.execute(f"""
+            SELECT DISTINCT Periode 
+            FROM agregat 
+            WHERE Id_Plante = ? AND Resolution = 'mois' AND {condition} 
+            ORDER BY Periode DESC 
+            LIMIT ?
+        """, (params['id_plante'], *key, params['limit'] + 1))
+        return paginate(
+            cursor.fetchall(), params['limit'],
+            lambda rows: [{"id": row[0], "date_rapport": row[0]} for row in rows],
+            lambda row: [row[0]]
+        )
+
+    @route('GET', '/GetRapport', params={'id_rapport': str}, optional={'id_plante': int},
+           cache_tags=lambda params: {f"plante:{params['id_plante']}" if params['id_plante'] else "rapports"},
+           not_found="Rapport not found")
+    def get_rapport(self, cursor, params):
+        cursor.execute("""
+            SELECT Date_Rapport, Id_Plante, Histo_Hum, Histo_Temp, Histo_Lum, Histo_Photo 
+            FROM rapport 
+            WHERE Date_Rapport = ? AND Id_Plante = IFNULL(?, Id_Plante)
+        """, (params['id_rapport'], params['id_plante']))
+        legacy_row = cursor.fetchone()
+        plant_id = params['id_plante'] or (legacy_row[1] if legacy_row else None)
+        if plant_id is None:
+            # rapport only holds the legacy months, newer ones are found from the monthly rollups
+            cursor.execute("""
+                SELECT Id_Plante 
+                FROM agregat 
+                WHERE Resolution = 'mois' AND Periode = ? 
+                ORDER BY Id_Plante 
+                LIMIT 1
+            """, (params['id_rapport'],))
+            row = cursor.fetchone()
+            plant_id = row[0] if row else None
+        return build_rapport(cursor, params['id_rapport'], plant_id, legacy_row) if plant_id else None
+
+    @route('GET', '/GetLatestRapport', params={'id_plante': int},
+           cache_tags=lambda params: {f"plante:{params['id_plante']}"}, not_found="No rapport found for this plant")
+    def get_latest_rapport(self, cursor, params):
+        cursor.execute("""
+            SELECT MAX(Date_Mesure) 
+            FROM mesure 
+            WHERE Id_Plante = ?
+        """, (params['id_plante'],))
+        latest = cursor.fetchone()[0]
+        return build_rapport(cursor, latest[:7], params['id_plante']) if latest else None
+
+    @route('GET', '/GetRapportAgrege', params={'id_plante': int},
+           optional={'debut': timestamp, 'fin': timestamp, 'resolution': str},
+           cache_tags=lambda params: {f"plante:{params['id_plante']}"},
+           not_found="No readings for this plant")
+    def get_rapport_agrege(self, cursor, params):
+        end = params['fin'] or datetime.datetime.now()
+        start = params['debut']
+        if start is None:
+            cursor.execute("""
+                SELECT MIN(Periode) 
+                FROM agregat 
+                WHERE Id_Plante = ? AND Resolution = 'mois'
+            """, (params['id_plante'],))
+            first_month = cursor.fetchone()[0]
+            if first_month is None:
+                return None
+            start = datetime.datetime.strptime(first_month, '%Y-%m')
+        if start > end:
+            raise RequestError(400, "debut must be before fin")
+
+        resolution = params['resolution'] or rollup_resolution(start, end)
+        if resolution not in {name for name, _, _ in ROLLUP_RESOLUTIONS}:
+            raise RequestError(400, f"Invalid value for parameter resolution: {resolution}")
+
+        return {
+            "id_plante": params['id_plante'],
+            "resolution": resolution,
+            "debut": start.strftime('%Y-%m-%d %H:%M:%S'),
+            "fin": end.strftime('%Y-%m-%d %H:%M:%S'),
+            "points": read_rollups(cursor, params['id_plante'], resolution, start, end)
+        }
+
+    @route('GET', '/GetHistorique', params={'id_plante': int},
+           optional={'debut': timestamp, 'fin': timestamp, 'metrique': str, 'pas': int},
+           cache_tags=lambda params: {f"plante:{params['id_plante']}"}, paginated=True)
+    def get_historique(self, cursor, params):
+        metric_columns = dict(ROLLUP_METRICS)
+        if params['metrique'] is not None and params['metrique'] not in metric_columns:
+            raise RequestError(400, f"Invalid value for parameter metrique: {params['metrique']}")
+        if params['pas'] is not None and params['pas'] <= 0:
+            raise RequestError(400, f"Invalid value for parameter pas: {params['pas']}")
+        names = [params['metrique']] if params['metrique'] else list(metric_columns)
+        columns = [metric_columns[name] for name in names]
+
+        start = params['debut'].strftime('%Y-%m-%d %H:%M:%S') if params['debut'] else ''
+        end = params['fin'].strftime('%Y-%m-%d %H:%M:%S') if params['fin'] else '9999-12-31 23:59:59'
+        not_null = f"AND {columns[0]} IS NOT NULL" if params['metrique'] else ""
+
+        if params['pas'] is None:
+            condition, key = keyset_condition(("Date_Mesure", "Id"), params['cursor'])
+            cursor.execute(f"""
+                SELECT Date_Mesure, Id, {json_object_sql(("date", *names), ("Date_Mesure", *columns))} 
+                FROM mesure 
+                WHERE Id_Plante = ? AND Date_Mesure >= ? AND Date_Mesure <= ? AND {condition} {not_null} 
+                ORDER BY Date_Mesure, Id 
+                LIMIT ?
+            """, (params['id_plante'], start, end, *key, params['limit'] + 1))
+            return paginate(cursor.fetchall(), params['limit'], json_rows, lambda row: list(row[:2]))
+
+        # Buckets are aligned on multiples of pas seconds, the cursor is the start of the last bucket sent
+        if params['cursor'] is not None:
+            if len(params['cursor']) != 1:
+                raise RequestError(400, "Invalid cursor")
+            cursor.execute("SELECT datetime(strftime('%s', ?) + ?, 'unixepoch')", (params['cursor'][0], params['pas']))
+            start = max(start, cursor.fetchone()[0] or '')
+        cursor.execute(f"""
+            SELECT 
+                datetime(CAST(strftime('%s', Date_Mesure) AS INTEGER) / ? * ?, 'unixepoch') AS Debut,
+                {', '.join(f"COUNT({column}), MIN({column}), MAX({column}), AVG({column})" for column in columns)}
+            FROM mesure 
+            WHERE Id_Plante = ? AND Date_Mesure >= ? AND Date_Mesure <= ? {not_null} 
+            GROUP BY Debut 
+            ORDER BY Debut 
+            LIMIT ?
+        """, (params['pas'], params['pas'], params['id_plante'], start, end, params['limit'] + 1))
+
+        def buckets(rows):
+            points = []
+            for row in rows:
+                point = {"debut": row[0]}
+                for index, name in enumerate(names):
+                    count, minimum, maximum, mean = row[1 + 4 * index:5 + 4 * index]
+                    point[name] = {"nb": count, "min": minimum, "max": maximum, "moyenne": mean} if count else None
+                points.append(point)
+            return points
+
+        return paginate(cursor.fetchall(), params['limit'], buckets, lambda row: [row[0]])
+
+    @route('GET', '/GetListeMembre', cache_tags=lambda params: {"membres"}, paginated=True)
+    def get_liste_membre(self, cursor, params):
+        condition, key = keyset_condition(("Classe", "Nom", "Id"), params['cursor'])
+        cursor.execute(f"""
+            SELECT Classe, Nom, Id, 
+                {json_object_sql(("id", "nom", "prenom", "classe", "role"), ("Id", "Nom", "Prenom", "Classe", "Role_Association"))} 
+            FROM membre 
+            WHERE {condition} 
+            ORDER BY Classe, Nom, Id 
+            LIMIT ?
+        """, (*key, params['limit'] + 1))
+        return paginate(cursor.fetchall(), params['limit'], json_rows, lambda row: list(row[:3]))
+
+    @route('GET', '/GetMembreInfos', params={'id_membre': int},
+           cache_tags=lambda params: {"membres", "interventions"}, not_found="Member not found")
+    def get_membre_infos(self, cursor, params):
+        cursor.execute("""
+            SELECT 
+                m.Nom, 
+                m.Prenom, 
+                m.Classe, 
+                m.Role_Association, 
+                m.Date_inscription,
+                (julianday('now') - julianday(m.Date_inscription)) / 365.25 AS Anciennete,
+                p.Nom AS Plante_Principale,
+                (SELECT COUNT(*) FROM intervention WHERE Id_intervenant = m.Id) AS Nombre_Interventions
+            FROM 
+                membre m
+            LEFT JOIN 
+                plante p ON m.Plante_Principale = p.Id
+            WHERE 
+                m.Id = ?
+        """, (params['id_membre'],))
+        membre = row_to_dict(
+            ("nom", "prenom", "classe", "role", "date_inscription", "anciennete_annees", "plante_principale", "nombre_interventions"),
+            cursor.fetchone()
+        )
+        if membre:
+            membre["anciennete_annees"] = round(membre["anciennete_annees"], 2)
+        return membre
+
+    @route('GET', '/GetHierarchie', cache_tags=lambda params: {"membres"})
+    def get_hierarchie(self, cursor, params):
+        cursor.execute("""
+            SELECT Nom, Prenom, Role_Association 
+            FROM membre 
+            WHERE Role_Association IN (
+                'President', 
+                'Vice President', 
+                'Secrétaire', 
+                'Trésorier', 
+                'Responsable Communication'
+            ) 
+            ORDER BY 
+                CASE Role_Association 
+                    WHEN 'President' THEN 1 
+                    WHEN 'Vice President' THEN 2 
+                    WHEN 'Secrétaire' THEN 3 
+                    WHEN 'Trésorier' THEN 4 
+                    WHEN 'Responsable Communication' THEN 5 
+                END
+        """)
+        return rows_to_dicts(("nom", "prenom", "role"), cursor.fetchall())
+
+    @route('GET', '/GetAgendaClasse', params={'classe': str},
+           cache_tags=lambda params: {"classes"}, not_found="Classe not found")
+    def get_agenda_classe(self, cursor, params):
+        cursor.execute("""
+            SELECT Agenda 
+            FROM classe 
+            WHERE Nom_classe = ?
+        """, (params['classe'],))
+        return row_to_dict(("agenda",), cursor.fetchone())
 
     def send_json_response(self, data):
+        headers = [('X-Next-Cursor', data.next_cursor)] if isinstance(data, Page) and data.next_cursor else []
+        if isinstance(data, list) and len(data) >= JSON_STREAM_MIN_ITEMS:
+            self.send_stream(json_chunks(data), headers)
+            return
+
+        if isinstance(data, TextResponse):
+            self.send_body(data.encode('utf-8'), content_type=data.content_type)
+            return
+
+        with metrics.timed("json_encode"):
+            body = encode_json(data)
+        etag = None
+        variants = {}
+        if getattr(self, 'cache_key', None):
+            etag = response_cache.put(self.cache_key, body, self.cache_tags, self.cache_generation, headers, variants)
+        self.send_body(body, etag, headers, variants, code=202 if isinstance(data, AcceptedResponse) else 200)
+
+    @property
+    def accepted_encoding(self):
+        # Preferred of gzip and deflate among those the client accepts with a non-zero q-value
+        accepted = {}
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, parameters = item.partition(';')
+            quality = 1.0
+            if parameters.strip().startswith('q='):
+                try:
+                    quality = float(parameters.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+        candidates = [encoding for encoding in ('gzip', 'deflate') if accepted.get(encoding, accepted.get('*', 0)) > 0]
+        return max(candidates, key=lambda encoding: accepted.get(encoding, 0), default=None)
+
+    def send_body(self, body, etag=None, headers=(), variants=None, content_type='application/json', code=200):
+        encoding = self.accepted_encoding if len(body) >= COMPRESSION_MIN_BYTES else None
+        if encoding:
+            variants = variants if variants is not None else {}
+            if encoding not in variants:
+                variants[encoding] = compress_body(body, encoding)
+            body = variants[encoding]
+            # Each encoding is a different representation and gets its own strong validator
+            etag = f'{etag[:-1]}-{encoding}"' if etag else None
+
+        if etag and etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return
+
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in headers:
+            self.send_header(name, value)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, chunks, headers=()):
+        # Chunked transfer encoding needs HTTP/1.1, an HTTP/1.0 body simply ends when the connection closes
+        chunked = self.protocol_version >= "HTTP/1.1"
+        encoding = self.accepted_encoding
+        if encoding:
+            chunks = compress_chunks(chunks, encoding)
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in headers:
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if chunked:
+                self.wfile.write(f"{len(chunk):X}\r\n".encode('ascii') + chunk + b"\r\n")
+            else:
+                self.wfile.write(chunk)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
 
     def send_error_response(self, code, message):
+        # Drain before answering so a "Connection: close" can still be announced
+        self.discard_body()
+        body = json.dumps({"error": message}).encode('utf-8')
         self.send_response(code)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps({"error": message}).encode('utf-8'))
+        self.wfile.write(body)
 
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-API-Key, X-Profile')
+        self.send_header('Access-Control-Expose-Headers', 'X-Next-Cursor, X-Profile-Id')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
 
-def initialize_database():
-    if os.path.exists(db_path):
-        logging.info(f"Database already exists at {db_path}. Skipping initialization.")
-        return
+def read_ndjson(stream, content_length):
+    readings = []
+    remaining = content_length
+    while remaining > 0:
+        line = stream.readline(remaining)
+        if not line:
+            break
+        remaining -= len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            readings.append(json.loads(line.decode('utf-8')))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            readings.append(None)
+    return readings
+
+
+def card_plant_ids(cursor, card_id):
+    return card_index.get(cursor, card_id)
+
+
+def image_extension(data):
+    if data.startswith(b'\xff\xd8'):
+        return 'jpg'
+    return 'png'
+
+
+def photo_blob_path(digest, extension):
+    return f"blobs/{digest[:2]}/{digest}.{extension}"
+
+
+def commit_photo_blob(temp_path, digest, extension):
+    # Blobs are named after their content, an image already on disk is never written twice
+    relative_path = photo_blob_path(digest, extension)
+    blob_path = os.path.join(photos_dir, relative_path)
+    if os.path.exists(blob_path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, blob_path)
+    return relative_path
+
+
+def store_photo_bytes(data, extension):
+    with metrics.timed("image_write"):
+        digest = hashlib.sha256(data).hexdigest()
+        relative_path = photo_blob_path(digest, extension)
+        if not os.path.exists(os.path.join(photos_dir, relative_path)):
+            fd, temp_path = tempfile.mkstemp(dir=photos_dir, suffix='.part')
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            relative_path = commit_photo_blob(temp_path, digest, extension)
+    return digest, relative_path, len(data)
+
+
+def store_photo_stream(stream, content_length, extension):
+    # The body goes to disk chunk by chunk, memory use does not depend on the image size.
+    # The timing includes receiving the upload, which is read from the socket as it is written.
+    digest = hashlib.sha256()
+    with metrics.timed("image_write"):
+        fd, temp_path = tempfile.mkstemp(dir=photos_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                remaining = content_length
+                while remaining > 0:
+                    chunk = stream.read(min(IMAGE_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError("Image upload ended before Content-Length bytes")
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        digest = digest.hexdigest()
+        relative_path = commit_photo_blob(temp_path, digest, extension)
+    return digest, relative_path, content_length
+
+
+def register_photos(cursor, photos, references):
+    if photos:
+        cursor.execute("""
+            INSERT OR IGNORE INTO photo (Empreinte, Chemin, Taille, Date_Ajout)
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'), json_extract(value, '$[3]')
+            FROM json_each(?)
+        """, (json.dumps(photos),))
+    if references:
+        cursor.execute("""
+            INSERT OR IGNORE INTO plante_photo (Id_Plante, Empreinte, Date_Photo)
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]')
+            FROM json_each(?)
+        """, (json.dumps(references),))
+
+
+def attach_photo(cursor, plant_ids, stored_photo, captured_at):
+    # An image sent apart from its reading goes to the plants and to their latest reading, if it is recent
+    digest, photo, size = stored_photo
+    register_photos(
+        cursor,
+        [(digest, photo, size, captured_at)],
+        [(plant_id, digest, captured_at) for plant_id in plant_ids]
+    )
+    card_plants = json.dumps(plant_ids)
+
+    cursor.execute("""
+        UPDATE plante
+        SET Derniere_Photo = ?
+        WHERE Id IN (SELECT value FROM json_each(?))
+    """, (photo, card_plants))
+    # A reading older than that belongs to an earlier upload whose image was lost, the photo stays on the plant only
+    oldest_reading = datetime.datetime.strptime(captured_at, '%Y-%m-%d %H:%M:%S') - datetime.timedelta(seconds=PHOTO_READING_MAX_AGE_SECONDS)
+    cursor.execute("""
+        UPDATE mesure
+        SET Photo = ?
+        WHERE Id IN (
+            SELECT (SELECT Id FROM mesure WHERE Id_Plante = plante.value ORDER BY Date_Mesure DESC LIMIT 1)
+            FROM json_each(?) AS plante
+        )
+        AND Date_Mesure BETWEEN ? AND ?
+        AND Photo IS NULL
+    """, (photo, card_plants, oldest_reading.strftime('%Y-%m-%d %H:%M:%S'), captured_at))
+
+
+def parse_reading_time(value, default, age=None):
+    # Boards without a set clock send the age of a buffered reading in seconds instead of its time
+    if value is None and age is not None:
+        if not is_measure(age) or age < 0:
+            raise ValueError(f"Invalid age: {age}")
+        return default - datetime.timedelta(seconds=age)
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value)
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def reading_humidity(sensor_data):
+    ground_humidity = sensor_data.get('ground_humidity', [])
+    return ground_humidity[0] if isinstance(ground_humidity, list) and ground_humidity else None
+
+
+def is_measure(value):
+    # A finite number or null: NaN, Infinity and integers beyond 64 bits cannot go through the JSON writes
+    if value is None:
+        return True
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def check_reading(cursor, sensor_data, received_at):
+    # Returns the time of the reading and the plants of its card, or raises RequestError
+    if not isinstance(sensor_data, dict):
+        raise RequestError(400, "Invalid reading")
+
+    # The ESP firmware sends "identifier", the test scripts send "id"
+    card_id = sensor_data.get('id', sensor_data.get('identifier'))
+    missing = [field for field in ('temperature', 'light') if field not in sensor_data]
+    if card_id is None or missing:
+        raise RequestError(400, f"Missing field(s): {', '.join((['id'] if card_id is None else []) + missing)}")
+    if not isinstance(card_id, str):
+        raise RequestError(400, "Invalid id")
+
+    try:
+        measured_at = parse_reading_time(sensor_data.get('timestamp'), received_at, sensor_data.get('age'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise RequestError(400, "Invalid timestamp")
+
+    measures = {'temperature': sensor_data['temperature'], 'light': sensor_data['light'], 'ground_humidity': reading_humidity(sensor_data)}
+    invalid = [field for field, value in measures.items() if not is_measure(value)]
+    if invalid:
+        raise RequestError(400, f"Invalid value(s): {', '.join(invalid)}")
+
+    plant_ids = card_plant_ids(cursor, card_id)
+    if not plant_ids:
+        raise RequestError(404, "No card found with this identifier")
+    return measured_at, plant_ids
+
+
+def rejected_reading(index, error):
+    result = {"index": index, "status": "error", "error": error.message}
+    if error.code != 400:
+        result["code"] = error.code
+    return result
+
+
+def store_reading_image(image):
+    with metrics.timed("base64_decode"):
+        try:
+            data = base64.b64decode(image)
+        except (TypeError, ValueError):
+            raise RequestError(400, "Invalid image")
+    return store_photo_bytes(data, image_extension(data))
+
+
+def ingest_readings(cursor, readings, stored_photos=None):
+    # stored_photos holds, for each reading, the (digest, path, size) of an image already
+    # written to the photo store, as done before journaling in write-behind mode
+    received_at = datetime.datetime.now()
+    results = []
+    mesures = []
+    photos = []
+    photo_references = []
+
+    for index, sensor_data in enumerate(readings):
+        try:
+            measured_at, plant_ids = check_reading(cursor, sensor_data, received_at)
+            stored_photo = stored_photos[index] if stored_photos else None
+            if stored_photo is None and sensor_data.get('image'):
+                stored_photo = store_reading_image(sensor_data['image'])
+        except RequestError as e:
+            results.append(rejected_reading(index, e))
+            continue
+
+        measured_at_text = measured_at.strftime('%Y-%m-%d %H:%M:%S')
+        humidity = reading_humidity(sensor_data)
+
+        # One blob per reading, shared by every plant watched by the card
+        photo = None
+        if stored_photo:
+            digest, photo, size = stored_photo
+            photos.append((digest, photo, size, measured_at_text))
+            photo_references.extend((plant_id, digest, measured_at_text) for plant_id in plant_ids)
+
+        for plant_id in plant_ids:
+            mesures.append((
+                plant_id,
+                measured_at_text,
+                humidity,
+                sensor_data['temperature'],
+                sensor_data['light'],
+                photo
+            ))
+
+        results.append({"index": index, "status": "success", "plants_updated": len(plant_ids)})
+
+    if not mesures:
+        return results, set()
+
+    # Every write below is one statement for the whole request, whatever the number of readings and plants
+    update_plants(cursor, mesures)
+    rows = json.dumps(mesures)
+    cursor.execute("""
+        INSERT INTO mesure (Id_Plante, Date_Mesure, Humidite, Temperature, Luminosite, Photo)
+        SELECT 
+            json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+            json_extract(value, '$[3]'), json_extract(value, '$[4]'), json_extract(value, '$[5]')
+        FROM json_each(?) 
+        ORDER BY key
+    """, (rows,))
+    update_rollups(cursor, rows)
+    register_photos(cursor, photos, photo_references)
+
+    return results, {mesure[0] for mesure in mesures}
+
+
+def update_plants(cursor, mesures):
+    # Buffered readings can arrive late: plante only takes values newer than the stored history.
+    # Only the most recent reading of a plant can pass, so each plant gets a single row holding its
+    # latest reading, latest photo and latest humidity; on equal dates the later reading wins
+    latest = {}
+    for plant_id, measured_at, humidity, temperature, light, photo in mesures:
+        row = latest.setdefault(plant_id, [plant_id, measured_at, temperature, light, None, None, None, None])
+        if measured_at >= row[1]:
+            row[1:4] = measured_at, temperature, light
+        if photo is not None and (row[4] is None or measured_at >= row[4]):
+            row[4:6] = measured_at, photo
+        if humidity is not None and (row[6] is None or measured_at >= row[6]):
+            row[6:8] = measured_at, humidity
+
+    # Dates are stored as '%Y-%m-%d %H:%M:%S' text, compared as strings; a NULL date never passes
+    cursor.execute("""
+        UPDATE plante 
+        SET 
+            Temperature = CASE WHEN lecture.Date_Mesure >= lecture.Derniere THEN lecture.Temperature ELSE plante.Temperature END,
+            Luminosite = CASE WHEN lecture.Date_Mesure >= lecture.Derniere THEN lecture.Luminosite ELSE plante.Luminosite END,
+            Derniere_Photo = CASE WHEN lecture.Date_Photo >= lecture.Derniere THEN lecture.Photo ELSE plante.Derniere_Photo END,
+            Humidite = CASE WHEN lecture.Date_Humidite >= lecture.Derniere THEN lecture.Humidite ELSE plante.Humidite END
+        FROM (
+            SELECT 
+                json_extract(value, '$[0]') AS Id_Plante,
+                json_extract(value, '$[1]') AS Date_Mesure,
+                json_extract(value, '$[2]') AS Temperature,
+                json_extract(value, '$[3]') AS Luminosite,
+                json_extract(value, '$[4]') AS Date_Photo,
+                json_extract(value, '$[5]') AS Photo,
+                json_extract(value, '$[6]') AS Date_Humidite,
+                json_extract(value, '$[7]') AS Humidite,
+                COALESCE((
+                    SELECT Date_Mesure FROM mesure 
+                    WHERE Id_Plante = json_extract(value, '$[0]') 
+                    ORDER BY Date_Mesure DESC LIMIT 1
+                ), '') AS Derniere
+            FROM json_each(?)
+        ) AS lecture
+        WHERE plante.Id = lecture.Id_Plante AND lecture.Date_Mesure >= lecture.Derniere
+    """, (json.dumps(list(latest.values())),))
+
+
+def update_rollups(cursor, rows):
+    # rows is the JSON array of the mesure rows [plant, date, humidity, temperature, light, photo]:
+    # each reading is parsed once, then fanned out to every metric and resolution. Rows sharing a key
+    # are folded by the upsert one after the other, and non-numeric values are left out of the rollups.
+    # WHERE true keeps the parser from reading ON CONFLICT as a join constraint
+    positions = [(name, position) for position, (name, _) in enumerate(ROLLUP_METRICS, 2)]
+    columns = ",\n".join(
+        f"json_extract(value, '$[{position}]') AS {name}, json_type(value, '$[{position}]') IN ('integer', 'real') AS {name}_ok"
+        for name, position in positions
+    )
+    values = "\nUNION ALL ".join(f"SELECT Id_Plante, Date_Mesure, '{name}', {name} FROM lecture WHERE {name}_ok" for name, _ in positions)
+    resolutions = ", ".join(f"('{name}', {length})" for name, length, _ in ROLLUP_RESOLUTIONS)
+
+    cursor.execute(f"""
+        WITH lecture AS MATERIALIZED (
+            SELECT json_extract(value, '$[0]') AS Id_Plante, json_extract(value, '$[1]') AS Date_Mesure, {columns}
+            FROM json_each(?)
+        ), valeur (Id_Plante, Date_Mesure, Metrique, Valeur) AS (
+            {values}
+        )
+        INSERT INTO agregat (Id_Plante, Resolution, Periode, Metrique, Nb, Min, Max, Somme)
+        SELECT Id_Plante, resolution.column1, substr(Date_Mesure, 1, resolution.column2), Metrique, 1, Valeur, Valeur, Valeur
+        FROM valeur, (VALUES {resolutions}) AS resolution
+        WHERE true
+        ON CONFLICT (Id_Plante, Resolution, Periode, Metrique) DO UPDATE SET 
+            Nb = Nb + 1,
+            Min = min(Min, excluded.Min),
+            Max = max(Max, excluded.Max),
+            Somme = Somme + excluded.Somme
+    """, (rows,))
+
+
+def rollup_resolution(start, end):
+    # Finest resolution that keeps the chart under ROLLUP_MAX_POINTS buckets
+    for name, _, width in ROLLUP_RESOLUTIONS:
+        if (end - start) / width <= ROLLUP_MAX_POINTS:
+            return name
+    return ROLLUP_RESOLUTIONS[-1][0]
+
+
+def read_rollups(cursor, plant_id, resolution, start, end):
+    length = next(length for name, length, _ in ROLLUP_RESOLUTIONS if name == resolution)
+    cursor.execute("""
+        SELECT Periode, Metrique, Nb, Min, Max, Somme 
+        FROM agregat 
+        WHERE Id_Plante = ? AND Resolution = ? AND Periode >= ? AND Periode <= ? 
+        ORDER BY Periode
+    """, (
+        plant_id,
+        resolution,
+        start.strftime('%Y-%m-%d %H:%M:%S')[:length],
+        end.strftime('%Y-%m-%d %H:%M:%S')[:length]
+    ))
+
+    points = {}
+    for period, metric, count, minimum, maximum, total in cursor.fetchall():
+        point = points.setdefault(period, {"periode": period})
+        point[metric] = {"nb": count, "min": minimum, "max": maximum, "moyenne": total / count}
+    return list(points.values())
+
+
+def month_bounds(month):
+    try:
+        start = datetime.datetime.strptime(month, '%Y-%m')
+    except (TypeError, ValueError):
+        return None
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def build_rapport(cursor, month, plant_id, legacy_row=None):
+    if legacy_row and legacy_row[1] != plant_id:
+        # The legacy strings belong to another plant of the same month
+        legacy_row = None
+    bounds = month_bounds(month)
+    if bounds is None:
+        # Months that could not be migrated to mesure are served from the legacy strings
+        if not legacy_row:
+            return None
+        return {
+            "date_rapport": legacy_row[0],
+            "historique_humidite": legacy_row[2],
+            "historique_temperature": legacy_row[3],
+            "historique_luminosite": legacy_row[4],
+            "photo": legacy_row[5]
+        }
+
+    cursor.execute("""
+        SELECT 
+            COUNT(*),
+            group_concat(IFNULL(Humidite, ''), ','),
+            group_concat(IFNULL(Temperature, ''), ','),
+            group_concat(IFNULL(Luminosite, ''), ','),
+            (SELECT Photo FROM mesure 
+             WHERE Id_Plante = ? AND Date_Mesure >= ? AND Date_Mesure < ? AND Photo IS NOT NULL 
+             ORDER BY Date_Mesure DESC LIMIT 1)
+        FROM (
+            SELECT Humidite, Temperature, Luminosite 
+            FROM mesure 
+            WHERE Id_Plante = ? AND Date_Mesure >= ? AND Date_Mesure < ? 
+            ORDER BY Date_Mesure
+        )
+    """, (plant_id, *bounds, plant_id, *bounds))
+    row = cursor.fetchone()
+    if not row[0]:
+        return None
+
+    return {
+        "date_rapport": month,
+        "historique_humidite": row[1],
+        "historique_temperature": row[2],
+        "historique_luminosite": row[3],
+        "photo": row[4] if row[4] else (legacy_row[5] if legacy_row else None)
+    }
+
+
+def journal_readings(cursor, readings):
+    # Validation and image storage happen before acknowledging, only the database writes are deferred.
+    # Readings are journaled with their arrival time so a replay stores them at the same date.
+    received_at = datetime.datetime.now()
+    results = []
+    entries = []
+    for index, sensor_data in enumerate(readings):
+        try:
+            measured_at, plant_ids = check_reading(cursor, sensor_data, received_at)
+            photo = store_reading_image(sensor_data['image']) if sensor_data.get('image') else None
+        except RequestError as e:
+            results.append(rejected_reading(index, e))
+            continue
+
+        reading = dict(sensor_data)
+        reading.pop('image', None)
+        if reading.pop('age', None) is not None or reading.get('timestamp') is None:
+            reading['timestamp'] = measured_at.strftime('%Y-%m-%d %H:%M:%S')
+        entries.append({"reading": reading, "photo": photo})
+        results.append({"index": index, "status": "accepted", "plants_updated": len(plant_ids)})
+
+    if entries:
+        sequence = iter(ingest_queue.append(entries))
+        for result in results:
+            if result["status"] == "accepted":
+                result["seq"] = next(sequence)
+    return results
+
+
+def database_busy(error):
+    # Locked database or no free pooled connection; error codes are only exposed from Python 3.11
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message or "waiting for a database connection" in message
+    )
+
+
+class IngestQueue:
+    # Write-behind ingestion. Accepted readings and images are appended to an NDJSON journal and fsynced
+    # before the 202 goes out, then a single writer thread applies them in group commits.
+    # The last applied sequence number is stored in journal_ingestion in the same transaction
+    # as the readings, so replaying the journal after a crash applies each reading exactly once.
+
+    def __init__(self, path, batch_size=WRITE_BEHIND_BATCH_SIZE, max_delay=WRITE_BEHIND_MAX_DELAY_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._pending = queue.SimpleQueue()
+        self._journal = None
+        self._thread = None
+        self._next_seq = 1
+        self._applied = 0
+
+    def start(self):
+        with db_pool.connection() as conn:
+            self._applied = conn.execute("SELECT Seq FROM journal_ingestion WHERE Id = 1").fetchone()[0]
+
+        last_seq = self._applied
+        replayed = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb+') as journal:
+                valid_end = 0
+                for line in journal:
+                    if not line.endswith(b"\n"):
+                        # Cut short by a crash before the fsync, this reading was never acknowledged
+                        logging.warning(f"Dropping an incomplete last line from {self.path}")
+                        break
+                    valid_end += len(line)
+                    entry = json.loads(line)
+                    last_seq = max(last_seq, entry["seq"])
+                    if entry["seq"] > self._applied:
+                        self._pending.put(entry)
+                        replayed += 1
+                journal.truncate(valid_end)
+        if replayed:
+            logging.info(f"Replaying {replayed} journaled readings after sequence {self._applied}")
+
+        self._next_seq = last_seq + 1
+        self._journal = open(self.path, 'ab')
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, entries):
+        # entries are {"reading", "photo"} for a reading and its stored image, or {"image", "captured_at", "photo"}
+        # for an image sent apart to /sensor-data/image. Returns their sequence numbers
+        with self._lock:
+            first_seq = self._next_seq
+            lines = []
+            for entry in entries:
+                lines.append({"seq": self._next_seq, **entry})
+                self._next_seq += 1
+            self._journal.write(b"".join(json.dumps(line).encode('utf-8') + b"\n" for line in lines))
+            self._journal.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(self._journal.fileno())
+            for line in lines:
+                self._pending.put(line)
+        metrics.inc("plant_ingest_journal_total", (("event", "appended"),), len(lines))
+        return list(range(first_seq, first_seq + len(lines)))
+
+    def _run(self):
+        while True:
+            entry = self._pending.get()
+            if entry is None:
+                return
+            # Group commit: whatever arrives within max_delay shares the transaction
+            batch = [entry]
+            deadline = time.monotonic() + self.max_delay
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._pending.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._apply(batch)
+            if stopping:
+                return
+
+    def _apply(self, batch):
+        last_seq = batch[-1]["seq"]
+        try:
+            results, plant_ids = self._write(batch, last_seq)
+        except Exception as e:
+            if len(batch) > 1:
+                # Applied one by one so only the faulty entry is left out
+                for entry in batch:
+                    self._apply([entry])
+                return
+            # Retrying would block every later reading, the checkpoint moves past this entry
+            logging.error(f"Journal entry {last_seq} skipped, it cannot be applied: {e}")
+            results, plant_ids = self._write([], last_seq)
+            metrics.inc("plant_ingest_journal_total", (("event", "skipped"),))
+
+        invalidate_plant_responses(plant_ids)
+        for entry, result in zip(batch, results):
+            if result["status"] != "success":
+                logging.warning(f"Journal entry {entry['seq']} rejected when applied: {result['error']}")
+        metrics.inc("plant_ingest_journal_total", (("event", "applied"),), len(results))
+        self._applied = last_seq
+        self._compact()
+
+    def _write(self, batch, last_seq):
+        # A busy database is waited for, any other error is the entry's own and is raised.
+        # Writing the checkpoint alone cannot be the fault of an entry, it is retried on every error
+        while True:
+            try:
+                with db_pool.connection() as conn:
+                    results, plant_ids = self._ingest(conn.cursor(TimedCursor), batch)
+                    conn.execute("UPDATE journal_ingestion SET Seq = ? WHERE Id = 1", (last_seq,))
+                    conn.commit()
+                return results, plant_ids
+            except sqlite3.Error as e:
+                if batch and not database_busy(e):
+                    raise
+                logging.error(f"Journal entries up to {last_seq} could not be applied, retrying: {e}")
+                time.sleep(WRITE_BEHIND_RETRY_SECONDS)
+
+    def _ingest(self, cursor, batch):
+        # Entries are applied in journal order, so an image lands on the reading sent just before it
+        results = []
+        plant_ids = set()
+        for is_image, entries in itertools.groupby(batch, key=lambda entry: "image" in entry):
+            entries = list(entries)
+            if not is_image:
+                entry_results, entry_plants = ingest_readings(
+                    cursor,
+                    [entry["reading"] for entry in entries],
+                    [entry["photo"] for entry in entries]
+                )
+                results += entry_results
+                plant_ids |= entry_plants
+                continue
+            for entry in entries:
+                card_plants = card_plant_ids(cursor, entry["image"])
+                if not card_plants:
+                    results.append({"status": "error", "error": "No card found with this identifier"})
+                    continue
+                attach_photo(cursor, card_plants, entry["photo"], entry["captured_at"])
+                results.append({"status": "success"})
+                plant_ids.update(card_plants)
+        return results, plant_ids
+
+    def _compact(self):
+        with self._lock:
+            if self._applied != self._next_seq - 1:
+                return
+            if os.fstat(self._journal.fileno()).st_size < JOURNAL_COMPACT_BYTES:
+                return
+            # Everything journaled is in the database, sequence numbers carry on from the checkpoint
+            self._journal.truncate(0)
+            os.fsync(self._journal.fileno())
+
+    def stop(self, timeout=SHUTDOWN_GRACE_SECONDS):
+        # Readings queued before the stop are applied first, later ones wait in the journal
+        self._pending.put(None)
+        self._thread.join(timeout)
+        with self._lock:
+            self._journal.close()
+
+
+ingest_queue = None
+
+
+class IdleConnections:
+    # Keep-alive connections waiting for their next request sit in a selector instead of on a worker.
+    # A connection goes back to the pool as soon as it is readable, or is closed once idle for
+    # KEEP_ALIVE_TIMEOUT_SECONDS. Only the selector thread touches the selector
+    def __init__(self, resume, close, timeout=KEEP_ALIVE_TIMEOUT_SECONDS):
+        self.resume = resume
+        self.close_connection = close
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+        self.selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._added = queue.SimpleQueue()
+        self._deadlines = {}
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="idle-connections", daemon=True)
+        self._thread.start()
+
+    def add(self, handler):
+        if self._closing:
+            return False
+        self._added.put(handler)
+        self._wakeup()
+        return True
+
+    def _wakeup(self):
+        try:
+            self._wakeup_write.send(b"\0")
+        except OSError:
+            pass
+
+    def _run(self):
+        while not self._closing:
+            timeout = None
+            if self._deadlines:
+                timeout = max(0, min(self._deadlines.values()) - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        while self._wakeup_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._remove(key.data)
+                self.resume(key.data)
+
+            while True:
+                try:
+                    handler = self._added.get_nowait()
+                except queue.Empty:
+                    break
+                self.selector.register(handler.connection, selectors.EVENT_READ, handler)
+                self._deadlines[handler] = time.monotonic() + self.timeout
+
+            now = time.monotonic()
+            for handler in [handler for handler, deadline in self._deadlines.items() if deadline <= now]:
+                self._remove(handler)
+                self.close_connection(handler)
+
+        for handler in list(self._deadlines):
+            self._remove(handler)
+            self.close_connection(handler)
+        while True:
+            try:
+                self.close_connection(self._added.get_nowait())
+            except queue.Empty:
+                break
+        self.selector.close()
+        self._wakeup_read.close()
+        self._wakeup_write.close()
+
+    def _remove(self, handler):
+        self.selector.unregister(handler.connection)
+        del self._deadlines[handler]
+
+    def close(self):
+        # Idle connections are closed right away on shutdown
+        self._closing = True
+        self._wakeup()
+        self._thread.join(SHUTDOWN_GRACE_SECONDS)
+
+
+class KeepAliveMixin:
+    supports_keep_alive = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        self.idle_connections = IdleConnections(self.resume_connection, self.close_parked)
+
+    def track_connection(self, handler, active):
+        with self.connections_lock:
+            if active:
+                self.connections.add(handler)
+            else:
+                self.connections.discard(handler)
+
+    def close_idle_connections(self):
+        # Connections waiting for their next request are closed right away on shutdown,
+        # those in the middle of a request are left to finish
+        self.idle_connections.close()
+        with self.connections_lock:
+            idle = [handler for handler in self.connections if handler.idle]
+        for handler in idle:
+            try:
+                handler.connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def serve_connection(self, request, client_address, handler=None):
+        # Runs on a worker until the client has nothing more to send, then parks the connection
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.resume()
+            if handler.keep_open:
+                self.park_connection(handler)
+                return
+        except ConnectionError:
+            # Clients drop idle keep-alive connections all the time
+            pass
+        except Exception:
+            self.handle_error(request, client_address)
+        self.shutdown_request(request)
+
+    def park_connection(self, handler):
+        if not self.idle_connections.add(handler):
+            self.close_parked(handler)
+
+    def resume_connection(self, handler):
+        try:
+            self.submit_connection(handler.request, handler.client_address, handler)
+        except RuntimeError:
+            # The pool is shutting down
+            self.close_parked(handler)
 
-    conn = sqlite3.connect(db_path)
+    def close_parked(self, handler):
+        handler.keep_open = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+
+class ThreadPoolHTTPServer(KeepAliveMixin, socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, max_workers=WORKER_COUNT):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http-worker")
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self.submit_connection(request, client_address)
+
+    def submit_connection(self, request, client_address, handler=None):
+        future = self.executor.submit(self.serve_connection, request, client_address, handler)
+        with self.in_flight_lock:
+            self.in_flight.add(future)
+        future.add_done_callback(self._request_done)
+
+    def _request_done(self, future):
+        with self.in_flight_lock:
+            self.in_flight.discard(future)
+
+    def server_close(self):
+        super().server_close()
+        self.close_idle_connections()
+        with self.in_flight_lock:
+            pending = set(self.in_flight)
+        if pending:
+            logging.info(f"Draining {len(pending)} in-flight request(s)")
+            wait_futures(pending, timeout=SHUTDOWN_GRACE_SECONDS)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncioHTTPServer(KeepAliveMixin, socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, max_concurrency=MAX_CONCURRENT_REQUESTS):
+        super().__init__(server_address, handler_class)
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="async-worker")
+        self._loop = None
+        self._stop_event = None
+        self._stopped = threading.Event()
+        # Connections resumed from idle, the accepted ones are tracked by the loop
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+
+    def serve_forever(self, poll_interval=0.5):
+        self._stopped.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._stopped.set()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        in_flight = set()
+        self.socket.setblocking(False)
+        stop_task = asyncio.ensure_future(self._stop_event.wait())
+
+        def request_done(future):
+            in_flight.discard(future)
+            semaphore.release()
+
+        try:
+            while True:
+                # Back-pressure: only accept a connection once a slot is free
+                acquire_task = asyncio.ensure_future(semaphore.acquire())
+                await asyncio.wait({acquire_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+                if not acquire_task.done():
+                    acquire_task.cancel()
+                    break
+
+                accept_task = asyncio.ensure_future(self._loop.sock_accept(self.socket))
+                await asyncio.wait({accept_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+                if not accept_task.done():
+                    accept_task.cancel()
+                    semaphore.release()
+                    break
+
+                request, client_address = accept_task.result()
+                request.setblocking(True)
+                future = self._loop.run_in_executor(self.executor, self.serve_connection, request, client_address)
+                in_flight.add(future)
+                future.add_done_callback(request_done)
+        finally:
+            stop_task.cancel()
+            self.close_idle_connections()
+            with self.in_flight_lock:
+                pending = in_flight | {asyncio.wrap_future(future) for future in self.in_flight}
+            if pending:
+                logging.info(f"Draining {len(pending)} in-flight request(s)")
+                await asyncio.wait(pending, timeout=SHUTDOWN_GRACE_SECONDS)
+            self._loop = None
+
+    def submit_connection(self, request, client_address, handler=None):
+        # Connections back from idle skip the accept slots, the executor queues them for a worker
+        future = self.executor.submit(self.serve_connection, request, client_address, handler)
+        with self.in_flight_lock:
+            self.in_flight.add(future)
+        future.add_done_callback(self._request_done)
+
+    def _request_done(self, future):
+        with self.in_flight_lock:
+            self.in_flight.discard(future)
+
+    def shutdown(self):
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._stop_event.set)
+            self._stopped.wait()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_server(mode=SERVER_MODE):
+    server_address = ("", PORT)
+    if mode == "threaded":
+        return ThreadPoolHTTPServer(server_address, PlantTrackingHandler, WORKER_COUNT)
+    if mode == "async":
+        return AsyncioHTTPServer(server_address, PlantTrackingHandler, MAX_CONCURRENT_REQUESTS)
+    if mode == "single":
+        return socketserver.TCPServer(server_address, PlantTrackingHandler)
+    raise ValueError(f"Unknown server mode: {mode}")
+
+
+def migration_initial_schema(conn):
     cursor = conn.cursor()
-    
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'classe'")
+    if cursor.fetchone():
+        # Databases created before versioning already hold the initial schema and their own data
+        return
+
     cursor.execute("""
     CREATE TABLE classe (
        Nom_classe VARCHAR(3) PRIMARY KEY,
@@ -627,32 +2702,395 @@ def initialize_database():
     ('Card013', '29,30')
     """)
         
-    conn.commit()
-    conn.close()
-    
     logging.info(f"Database initialized at {db_path}")
 
+
+def parse_history(history):
+    values = []
+    for value in (history or '').split(','):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            values.append(float(value))
+        except ValueError:
+            values.append(None)
+    return values
+
+
+def migration_rapport_histories(conn):
+    cursor = conn.cursor()
+    last_rowid = 0
+    migrated = 0
+
+    while True:
+        cursor.execute("""
+            SELECT rowid, Date_Rapport, Id_Plante, Histo_Hum, Histo_Temp, Histo_Lum, Histo_Photo 
+            FROM rapport 
+            WHERE rowid > ? AND (Histo_Hum != '' OR Histo_Temp != '' OR Histo_Lum != '')
+            ORDER BY rowid 
+            LIMIT ?
+        """, (last_rowid, MIGRATION_BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+
+        readings = []
+        migrated_months = []
+        for _, month, plant_id, histo_hum, histo_temp, histo_lum, histo_photo in rows:
+            try:
+                month_start = datetime.datetime.strptime(month, '%Y-%m')
+            except ValueError:
+                logging.warning(f"Rapport {month} has an invalid month, keeping its history as is")
+                continue
+            if plant_id is None:
+                logging.warning(f"Rapport {month} has no plant, keeping its history as is")
+                continue
+
+            series = [parse_history(histo_hum), parse_history(histo_temp), parse_history(histo_lum)]
+            count = max(len(values) for values in series)
+
+            # The legacy strings carry no timestamps, readings are laid out hourly from the start of the month
+            for index in range(count):
+                humidity, temperature, light = (values[index] if index < len(values) else None for values in series)
+                readings.append((
+                    plant_id,
+                    (month_start + datetime.timedelta(hours=index)).strftime('%Y-%m-%d %H:%M:%S'),
+                    humidity,
+                    temperature,
+                    light,
+                    histo_photo if index == count - 1 else None
+                ))
+            migrated_months.append((month,))
+
+        with migration_transaction(conn):
+            cursor.executemany("""
+                INSERT INTO mesure (Id_Plante, Date_Mesure, Humidite, Temperature, Luminosite, Photo)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, readings)
+            cursor.executemany("""
+                UPDATE rapport 
+                SET Histo_Hum = '', Histo_Temp = '', Histo_Lum = '' 
+                WHERE Date_Rapport = ?
+            """, migrated_months)
+        migrated += len(migrated_months)
+        time.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+    if migrated:
+        logging.info(f"Migrated {migrated} rapport histories to the mesure table")
+
+
+def migration_mesure(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS mesure (
+       Id INTEGER PRIMARY KEY,
+       Id_Plante INTEGER NOT NULL,
+       Date_Mesure VARCHAR(19) NOT NULL,
+       Humidite REAL,
+       Temperature REAL,
+       Luminosite REAL,
+       Photo VARCHAR(80),
+       FOREIGN KEY (Id_Plante) REFERENCES plante(Id)
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_mesure_plante_date 
+    ON mesure (Id_Plante, Date_Mesure)
+    """)
+
+
+def migration_photo_store(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS photo (
+       Empreinte VARCHAR(64) PRIMARY KEY,
+       Chemin VARCHAR(80) NOT NULL,
+       Taille INTEGER NOT NULL,
+       Date_Ajout VARCHAR(19) NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS plante_photo (
+       Id_Plante INTEGER NOT NULL,
+       Empreinte VARCHAR(64) NOT NULL,
+       Date_Photo VARCHAR(19) NOT NULL,
+       PRIMARY KEY (Id_Plante, Date_Photo, Empreinte),
+       FOREIGN KEY (Id_Plante) REFERENCES plante(Id),
+       FOREIGN KEY (Empreinte) REFERENCES photo(Empreinte)
+    )
+    """)
+
+
+def migration_lookup_indexes(conn):
+    # Lookup paths of the GET endpoints, checked by query_plan_check.py
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_intervention_plante_date 
+    ON intervention (Id_Plante, Date_intervention)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_intervention_intervenant 
+    ON intervention (Id_intervenant)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rapport_plante_date 
+    ON rapport (Id_Plante, Date_Rapport)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_membre_classe_nom 
+    ON membre (Classe, Nom)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_membre_role 
+    ON membre (Role_Association)
+    """)
+
+
+def migration_carte_plante(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS carte_plante (
+       Identifier VARCHAR(50) NOT NULL,
+       Id_Plante INTEGER NOT NULL,
+       PRIMARY KEY (Identifier, Id_Plante),
+       FOREIGN KEY (Identifier) REFERENCES Cartes(Identifier),
+       FOREIGN KEY (Id_Plante) REFERENCES plante(Id)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("SELECT Identifier, Plantes FROM Cartes")
+    links = []
+    for card_id, plants in cursor.fetchall():
+        for plant_id in (plants or '').split(','):
+            if plant_id.strip().isdigit():
+                links.append((card_id, int(plant_id)))
+            elif plant_id.strip():
+                logging.warning(f"Card {card_id} lists an invalid plant id {plant_id!r}, skipping it")
+    cursor.executemany("INSERT OR IGNORE INTO carte_plante (Identifier, Id_Plante) VALUES (?, ?)", links)
+
+
+def migration_carte_plante_triggers(conn):
+    # Older tools still write Cartes (Identifier, Plantes), the triggers keep carte_plante in step.
+    # Entries that are not plant ids are skipped, as migration_carte_plante does
+    links = """INSERT OR IGNORE INTO carte_plante (Identifier, Id_Plante)
+        SELECT NEW.Identifier, CAST(trim(entry.value) AS INTEGER) 
+        FROM (SELECT '["' || replace(IFNULL(NEW.Plantes, ''), ',', '","') || '"]' AS list) AS plantes, 
+             json_each(CASE WHEN json_valid(plantes.list) THEN plantes.list ELSE '[]' END) AS entry 
+        WHERE trim(entry.value) != '' AND trim(entry.value) NOT GLOB '*[^0-9]*'"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cartes_insert_links AFTER INSERT ON Cartes
+    BEGIN
+        {links};
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS cartes_update_links AFTER UPDATE OF Identifier, Plantes ON Cartes
+    BEGIN
+        DELETE FROM carte_plante WHERE Identifier = OLD.Identifier;
+        {links};
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS cartes_delete_links AFTER DELETE ON Cartes
+    BEGIN
+        DELETE FROM carte_plante WHERE Identifier = OLD.Identifier;
+    END
+    """)
+
+    # Cards written or changed since carte_plante was filled
+    cursor.execute("DELETE FROM carte_plante WHERE Identifier IN (SELECT Identifier FROM Cartes)")
+    migration_carte_plante(conn)
+
+
+def migration_agregat(conn):
+    cursor = conn.cursor()
+    with migration_transaction(conn):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS agregat (
+           Id_Plante INTEGER NOT NULL,
+           Resolution VARCHAR(5) NOT NULL,
+           Periode VARCHAR(13) NOT NULL,
+           Metrique VARCHAR(11) NOT NULL,
+           Nb INTEGER NOT NULL,
+           Min REAL,
+           Max REAL,
+           Somme REAL,
+           PRIMARY KEY (Id_Plante, Resolution, Periode, Metrique),
+           FOREIGN KEY (Id_Plante) REFERENCES plante(Id)
+        ) WITHOUT ROWID
+        """)
+
+    # Rollups are rebuilt a chunk of plants at a time, INSERT OR REPLACE makes a restart harmless
+    last_plant = -1
+    migrated = 0
+
+    while True:
+        cursor.execute("""
+            SELECT DISTINCT Id_Plante 
+            FROM mesure 
+            WHERE Id_Plante > ? 
+            ORDER BY Id_Plante 
+            LIMIT ?
+        """, (last_plant, MIGRATION_BATCH_SIZE))
+        plant_ids = [row[0] for row in cursor.fetchall()]
+        if not plant_ids:
+            break
+        first_plant, last_plant = plant_ids[0], plant_ids[-1]
+
+        with migration_transaction(conn):
+            for resolution, length, _ in ROLLUP_RESOLUTIONS:
+                for metric, column in ROLLUP_METRICS:
+                    cursor.execute(f"""
+                        INSERT OR REPLACE INTO agregat (Id_Plante, Resolution, Periode, Metrique, Nb, Min, Max, Somme)
+                        SELECT Id_Plante, ?, substr(Date_Mesure, 1, {length}), ?, COUNT({column}), MIN({column}), MAX({column}), SUM({column})
+                        FROM mesure 
+                        WHERE Id_Plante BETWEEN ? AND ? AND {column} IS NOT NULL 
+                        GROUP BY Id_Plante, substr(Date_Mesure, 1, {length})
+                    """, (resolution, metric, first_plant, last_plant))
+        migrated += len(plant_ids)
+        if len(plant_ids) < MIGRATION_BATCH_SIZE:
+            break
+        time.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+    if migrated:
+        logging.info(f"Built the rollups of {migrated} plants")
+
+
+def migration_agregat_mois_index(conn):
+    # /GetRapport without a plant looks a month up across plants
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_agregat_mois 
+    ON agregat (Periode, Id_Plante) WHERE Resolution = 'mois'
+    """)
+
+
+def migration_journal_ingestion(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS journal_ingestion (
+       Id INTEGER PRIMARY KEY CHECK (Id = 1),
+       Seq INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO journal_ingestion (Id, Seq) VALUES (1, 0)")
+
+
+# (version, description, step, batched)
+# Steps must be idempotent. Batched steps are backfills that commit in short transactions
+# of MIGRATION_BATCH_SIZE rows so a running server is never locked out for long; they are
+# resumed from the start if interrupted, and the version is only recorded once they finish.
+MIGRATIONS = [
+    (1, "initial schema", migration_initial_schema, False),
+    (2, "mesure time-series table", migration_mesure, False),
+    (3, "rapport histories moved to mesure", migration_rapport_histories, True),
+    (4, "content-addressed photo store", migration_photo_store, False),
+    (5, "lookup indexes", migration_lookup_indexes, False),
+    (6, "carte_plante card to plant mapping", migration_carte_plante, False),
+    (7, "agregat hourly, daily and monthly rollups", migration_agregat, True),
+    (8, "journal_ingestion write-behind checkpoint", migration_journal_ingestion, False),
+    (9, "agregat monthly lookup index", migration_agregat_mois_index, False),
+    (10, "carte_plante kept in step with Cartes by triggers", migration_carte_plante_triggers, False),
+]
+
+
+@contextlib.contextmanager
+def migration_transaction(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def initialize_database():
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(
+            f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required, "
+            f"this Python is linked against SQLite {sqlite3.sqlite_version}"
+        )
+
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode = WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    pending = [migration for migration in MIGRATIONS if migration[0] > version]
+    if not pending:
+        logging.info(f"Database at {db_path} is up to date (schema version {version})")
+    apply_migrations(conn, pending)
+
+    conn.close()
+
+
+def apply_migrations(conn, pending):
+    for number, description, step, batched in pending:
+        logging.info(f"Applying migration {number}: {description}")
+        if batched:
+            step(conn)
+            with migration_transaction(conn):
+                conn.execute(f"PRAGMA user_version = {number}")
+        else:
+            with migration_transaction(conn):
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+
+
+def schema_script():
+    # SQL/database.sql is generated from MIGRATIONS, the schema is only written in the migrations
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    apply_migrations(conn, MIGRATIONS)
+    statements = []
+    for (sql,) in conn.execute("""
+        SELECT sql 
+        FROM sqlite_master 
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' 
+        ORDER BY rowid
+    """):
+        first, _, rest = sql.partition("\n")
+        lines = [line.rstrip() for line in textwrap.dedent(rest).splitlines() if line.strip()]
+        statements.append("\n".join([first.rstrip(), *lines]) + ";")
+    conn.close()
+
+    return (
+        "-- Latest schema, generated from the MIGRATIONS list of API/server/server.py by `python server.py schema`.\n"
+        "-- Do not edit by hand: add a migration, then regenerate this file.\n\n"
+        f"PRAGMA user_version = {MIGRATIONS[-1][0]};\n\n"
+        + "\n\n".join(statements) + "\n\n"
+        + SCHEMA_DEFAULT_ROWS
+    )
+
+
 if __name__ == "__main__":
+    if sys.argv[1:] == ["schema"]:
+        with open(schema_path, "w") as schema_file:
+            schema_file.write(schema_script())
+        sys.exit(0)
     initialize_database()
+    if sys.argv[1:] == ["migrate"]:
+        sys.exit(0)
+    with db_pool.connection() as conn:
+        card_index.load(conn.cursor())
+    if INGEST_MODE == "write_behind":
+        ingest_queue = IngestQueue(journal_path)
+        ingest_queue.start()
     try:
-        with socketserver.TCPServer(("", PORT), PlantTrackingHandler) as httpd:
-            logging.info(f"Server running on port {PORT}")
+        with create_server() as httpd:
+            signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
+            logging.info(f"Server running on port {PORT} ({SERVER_MODE} mode)")
             logging.info("Available endpoints:")
-            logging.info("- /GetPlantList")
-            logging.info("- /GetPlantInfos?id={plantId}")
-            logging.info("- /GetPlantBesoins?id={plantId}")
-            logging.info("- /GetPlantInterventions?id_plante={plantId}")
-            logging.info("- /GetInterventionInfos?id_intervention={interventionId}")
-            logging.info("- /GetLatestIntervention?id_plante={plantId}")
-            logging.info("- /GetAllRapports?id_plante={plantId}")
-            logging.info("- /GetRapport?id_rapport={rapportId}")
-            logging.info("- /GetLatestRapport?id_plante={plantId}")
-            logging.info("- /GetListeMembre")
-            logging.info("- /GetMembreInfos?id_membre={membreId}")
-            logging.info("- /GetHierarchie")
-            logging.info("- /GetAgendaClasse?classe={className}")
-            logging.info("ESP endpoint: /sensor-data (POST)")
+            for registered_route in ROUTES.values():
+                logging.info(f"- {registered_route.describe()}")
             
             httpd.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Server stopped")
     except Exception as e:
-        logging.critical(f"Error starting server: {e}")
\ No newline at end of file
+        logging.critical(f"Error starting server: {e}")
+    finally:
+        if ingest_queue is not None:
+            ingest_queue.stop()
+        db_pool.close()
\ No newline at end of file
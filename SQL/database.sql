@@ -1,3 +1,8 @@
+-- Latest schema, generated from the MIGRATIONS list of API/server/server.py by `python server.py schema`.
+-- Do not edit by hand: add a migration, then regenerate this file.
+
+PRAGMA user_version = 10;
+
 CREATE TABLE classe (
    Nom_classe VARCHAR(3) PRIMARY KEY,
    Agenda VARCHAR(255)
@@ -55,8 +60,108 @@ CREATE TABLE Cartes (
    Plantes VARCHAR(20) DEFAULT ''
 );
 
+CREATE TABLE mesure (
+   Id INTEGER PRIMARY KEY,
+   Id_Plante INTEGER NOT NULL,
+   Date_Mesure VARCHAR(19) NOT NULL,
+   Humidite REAL,
+   Temperature REAL,
+   Luminosite REAL,
+   Photo VARCHAR(80),
+   FOREIGN KEY (Id_Plante) REFERENCES plante(Id)
+);
+
+CREATE INDEX idx_mesure_plante_date
+ON mesure (Id_Plante, Date_Mesure);
+
+CREATE TABLE photo (
+   Empreinte VARCHAR(64) PRIMARY KEY,
+   Chemin VARCHAR(80) NOT NULL,
+   Taille INTEGER NOT NULL,
+   Date_Ajout VARCHAR(19) NOT NULL
+);
+
+CREATE TABLE plante_photo (
+   Id_Plante INTEGER NOT NULL,
+   Empreinte VARCHAR(64) NOT NULL,
+   Date_Photo VARCHAR(19) NOT NULL,
+   PRIMARY KEY (Id_Plante, Date_Photo, Empreinte),
+   FOREIGN KEY (Id_Plante) REFERENCES plante(Id),
+   FOREIGN KEY (Empreinte) REFERENCES photo(Empreinte)
+);
+
+CREATE INDEX idx_intervention_plante_date
+ON intervention (Id_Plante, Date_intervention);
+
+CREATE INDEX idx_intervention_intervenant
+ON intervention (Id_intervenant);
+
+CREATE INDEX idx_rapport_plante_date
+ON rapport (Id_Plante, Date_Rapport);
+
+CREATE INDEX idx_membre_classe_nom
+ON membre (Classe, Nom);
+
+CREATE INDEX idx_membre_role
+ON membre (Role_Association);
+
+CREATE TABLE carte_plante (
+   Identifier VARCHAR(50) NOT NULL,
+   Id_Plante INTEGER NOT NULL,
+   PRIMARY KEY (Identifier, Id_Plante),
+   FOREIGN KEY (Identifier) REFERENCES Cartes(Identifier),
+   FOREIGN KEY (Id_Plante) REFERENCES plante(Id)
+) WITHOUT ROWID;
+
+CREATE TABLE agregat (
+   Id_Plante INTEGER NOT NULL,
+   Resolution VARCHAR(5) NOT NULL,
+   Periode VARCHAR(13) NOT NULL,
+   Metrique VARCHAR(11) NOT NULL,
+   Nb INTEGER NOT NULL,
+   Min REAL,
+   Max REAL,
+   Somme REAL,
+   PRIMARY KEY (Id_Plante, Resolution, Periode, Metrique),
+   FOREIGN KEY (Id_Plante) REFERENCES plante(Id)
+) WITHOUT ROWID;
+
+CREATE TABLE journal_ingestion (
+   Id INTEGER PRIMARY KEY CHECK (Id = 1),
+   Seq INTEGER NOT NULL
+);
+
+CREATE INDEX idx_agregat_mois
+ON agregat (Periode, Id_Plante) WHERE Resolution = 'mois';
+
+CREATE TRIGGER cartes_insert_links AFTER INSERT ON Cartes
+BEGIN
+    INSERT OR IGNORE INTO carte_plante (Identifier, Id_Plante)
+    SELECT NEW.Identifier, CAST(trim(entry.value) AS INTEGER)
+    FROM (SELECT '["' || replace(IFNULL(NEW.Plantes, ''), ',', '","') || '"]' AS list) AS plantes,
+         json_each(CASE WHEN json_valid(plantes.list) THEN plantes.list ELSE '[]' END) AS entry
+    WHERE trim(entry.value) != '' AND trim(entry.value) NOT GLOB '*[^0-9]*';
+END;
+
+CREATE TRIGGER cartes_update_links AFTER UPDATE OF Identifier, Plantes ON Cartes
+BEGIN
+    DELETE FROM carte_plante WHERE Identifier = OLD.Identifier;
+    INSERT OR IGNORE INTO carte_plante (Identifier, Id_Plante)
+    SELECT NEW.Identifier, CAST(trim(entry.value) AS INTEGER)
+    FROM (SELECT '["' || replace(IFNULL(NEW.Plantes, ''), ',', '","') || '"]' AS list) AS plantes,
+         json_each(CASE WHEN json_valid(plantes.list) THEN plantes.list ELSE '[]' END) AS entry
+    WHERE trim(entry.value) != '' AND trim(entry.value) NOT GLOB '*[^0-9]*';
+END;
+
+CREATE TRIGGER cartes_delete_links AFTER DELETE ON Cartes
+BEGIN
+    DELETE FROM carte_plante WHERE Identifier = OLD.Identifier;
+END;
+
 -- Default Values
 INSERT INTO classe (Nom_classe, Agenda) VALUES ('DE', 'Agenda DEFAULT');
 
 INSERT INTO membre (Cle_API, Nom, Prenom, Classe, Role_Association, Photo_profil, Date_inscription, Plante_Principale) 
-VALUES ('DEFAULT_API_KEY', 'Everyone', 'Everyone', 'DE', 'Everyone', 'everyone', '2024-01-01', NULL);
\ No newline at end of file
+VALUES ('DEFAULT_API_KEY', 'Everyone', 'Everyone', 'DE', 'Everyone', 'everyone', '2024-01-01', NULL);
+
+INSERT INTO journal_ingestion (Id, Seq) VALUES (1, 0);
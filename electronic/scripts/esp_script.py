@@ -4,6 +4,8 @@ import machine
 import sdcard
 import uos
 import base64
+import json
+import time
 from machine import I2C, Pin, ADC
 import dht
 import esp32_cam
@@ -22,6 +24,13 @@ LightScl = 22
 GroundHumidityPins = [33, 32, 35]
 PowerManagementPin = 27
 
+BufferFile = "/sd/sensor_logs/buffer.ndjson"
+# Lines sent per request when flushing the buffer, the server accepts at most 1000
+BufferBatchLines = 200
+
+# Send the JPEG frame as a raw body to /sensor-data/image instead of base64 inside the JSON
+SendRawImage = True
+
 CameraPins = {
     "PWDN": 32,
     "RESET": -1,
@@ -55,8 +64,6 @@ class SensorNode:
         
         self.powerPin = Pin(PowerManagementPin, Pin.OUT)
         
-        self.logCounter = 0
-        
         try:
             self.sd = sdcard.SDCard(machine.SPI(1), machine.Pin(5))
             uos.mount(self.sd, '/sd')
@@ -120,11 +127,13 @@ class SensorNode:
         except Exception:
             return [None] * len(self.groundHumiditySensors)
     
-    def captureImage(self):
+    def captureImage(self, raw=False):
         try:
             self.camera.init()
             frame = self.camera.capture()
             if frame:
+                if raw:
+                    return frame
                 return base64.b64encode(frame).decode('utf-8')
             return None
         except Exception:
@@ -138,7 +147,7 @@ class SensorNode:
         light = self.readLightIntensity()
         ground_humidity = self.readGroundHumidity()
         
-        image_base64 = self.captureImage()
+        image = self.captureImage(raw=SendRawImage)
         
         sensorData = {
             "identifier": identifier,
@@ -146,25 +155,98 @@ class SensorNode:
             "humidity": humidity if humidity is not None else None,
             "light": light if light is not None else None,
             "ground_humidity": ground_humidity if all(value is not None for value in ground_humidity) else [None] * len(ground_humidity),
-            "image": image_base64
+            "image": None if SendRawImage else image
         }
         
         try:
             if self.wifi.isconnected():
+                self.flushBufferedData()
                 url = f"http://{ReceiverIP}:{ReceiverPort}/sensor-data"
                 urequests.post(url, json=sensorData)
+                
+                if SendRawImage and image:
+                    url = f"http://{ReceiverIP}:{ReceiverPort}/sensor-data/image?id={identifier}"
+                    urequests.post(url, data=image, headers={"Content-Type": "image/jpeg"})
             else:
                 if self.sd:
-                    self.logCounter += 1
-                    filename = f"/sd/sensor_logs/sensor_data_{self.logCounter}.txt"
+                    # Images are not buffered, the batch sent on reconnect has to fit in RAM
+                    sensorData["image"] = None
+                    # The clock is never set but keeps running through deep sleep: the time elapsed
+                    # since the reading is sent as its age and the server works out the date
+                    sensorData["recorded_at"] = time.time()
                     
-                    with open(filename, 'w') as f:
-                        f.write(str(sensorData))
+                    with open(BufferFile, 'a') as f:
+                        f.write(json.dumps(sensorData) + "\n")
         except Exception:
             pass
         
         self.powerPin.value(0)
     
+    def flushBufferedData(self):
+        if not self.sd:
+            return
+        
+        try:
+            bufferFile = open(BufferFile, 'r')
+        except OSError:
+            return
+        
+        # Sent in chunks so neither the request nor the RAM grows with the time spent offline
+        sentOffset = 0
+        sent = True
+        with bufferFile:
+            while sent:
+                lines = []
+                while len(lines) < BufferBatchLines:
+                    line = bufferFile.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        lines.append(self.withAge(line))
+                if not lines:
+                    break
+                sent = self.postBatch("".join(lines))
+                if sent:
+                    sentOffset = bufferFile.tell()
+        
+        if sent:
+            uos.remove(BufferFile)
+        elif sentOffset:
+            self.keepUnsent(sentOffset)
+    
+    def withAge(self, line):
+        try:
+            reading = json.loads(line)
+        except ValueError:
+            return line
+        recordedAt = reading.pop("recorded_at", None)
+        now = time.time()
+        # A clock reset by a power loss gives no usable age, the server then uses the arrival time
+        if recordedAt is not None and now >= recordedAt:
+            reading["age"] = now - recordedAt
+        return json.dumps(reading) + "\n"
+    
+    def postBatch(self, data):
+        try:
+            url = f"http://{ReceiverIP}:{ReceiverPort}/sensor-data/batch"
+            response = urequests.post(url, data=data, headers={"Content-Type": "application/x-ndjson"})
+            # 202: the server journaled the batch and applies it in the background
+            sent = response.status_code in (200, 202)
+            response.close()
+            return sent
+        except Exception:
+            return False
+    
+    def keepUnsent(self, offset):
+        # Only the lines after the last chunk accepted by the server stay in the buffer
+        pendingFile = BufferFile + ".pending"
+        with open(BufferFile, 'r') as source, open(pendingFile, 'w') as pending:
+            source.seek(offset)
+            for line in source:
+                pending.write(line)
+        uos.remove(BufferFile)
+        uos.rename(pendingFile, BufferFile)
+    
     def deepSleep(self, sleepMs=3600000):
         machine.deepsleep(sleepMs)
 